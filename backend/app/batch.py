@@ -0,0 +1,116 @@
+"""Parsing and streaming helpers for the batch /predict endpoint."""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import csv
+import io
+import json
+import math
+from typing import Any, Iterable, Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+BATCH_FIELDS = ("N", "P", "K", "ph", "lat", "lon")
+
+
+class BatchRow(BaseModel):
+    N: float
+    P: float
+    K: float
+    ph: float
+    lat: float
+    lon: float
+    # Optional soil photo, base64 (a data: URI prefix is accepted)
+    image: Optional[str] = None
+
+    @field_validator("N", "P", "K", "ph", "lat", "lon")
+    @classmethod
+    def _finite(cls, value: float) -> float:
+        if not math.isfinite(value):
+            raise ValueError("must be a finite number")
+        return value
+
+    @field_validator("image", mode="before")
+    @classmethod
+    def _blank_image(cls, value: Any) -> Any:
+        return None if value in ("", None) else value
+
+
+def _error_text(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+def _records_from_json(body: bytes) -> list[Any]:
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON body: {e}")
+    if isinstance(data, dict):
+        data = data.get("rows")
+    if not isinstance(data, list):
+        raise ValueError("JSON body must be an array of rows or {\"rows\": [...]}")
+    return data
+
+
+def _records_from_csv(body: bytes) -> list[Any]:
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("CSV body must be UTF-8")
+    reader = csv.DictReader(io.StringIO(text))
+    header = {name.strip() for name in (reader.fieldnames or [])}
+    missing = [f for f in BATCH_FIELDS if f not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing columns: {missing}")
+    return [{(k or "").strip(): v for k, v in record.items()} for record in reader]
+
+
+def parse_rows(body: bytes, content_type: str, max_rows: int) -> list[BatchRow | str]:
+    """
+    Parse a JSON array / {"rows": [...]} or a CSV body into rows. Rows that
+    fail validation come back as an error string in their original position
+    so the response can report them without failing the whole batch.
+    """
+    if "csv" in content_type:
+        records = _records_from_csv(body)
+    else:
+        records = _records_from_json(body)
+
+    if not records:
+        raise ValueError("Batch contains no rows")
+    if len(records) > max_rows:
+        raise ValueError(f"Batch has {len(records)} rows, the limit is {max_rows}")
+
+    rows: list[BatchRow | str] = []
+    for record in records:
+        if not isinstance(record, dict):
+            rows.append("row must be an object")
+            continue
+        try:
+            rows.append(BatchRow.model_validate(record))
+        except ValidationError as e:
+            rows.append(_error_text(e))
+    return rows
+
+
+def decode_image_field(value: str) -> bytes:
+    """Decode a base64 image field, tolerating a data: URI prefix."""
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("image is not valid base64")
+
+
+def chunked(items: list[Any], size: int) -> Iterable[list[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ndjson_line(obj: dict[str, Any]) -> bytes:
+    return (json.dumps(obj, separators=(",", ":"), default=str) + "\n").encode("utf-8")
@@ -0,0 +1 @@
+"""Farmer chat assistant: LLM backends and the gateway that calls them."""
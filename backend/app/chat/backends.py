@@ -0,0 +1,170 @@
+"""
+Chat backends. A backend turns (model name, message, history) into reply
+text with a blocking call, or into an iterator of text chunks as the model
+produces them; `ChatGateway` runs both off the event loop. Closing the
+chunk iterator early stops the upstream generation.
+
+    gemini  google-generativeai SDK, configured once per process
+    stub    canned local replies for offline development and tests
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Iterable, Iterator, Protocol
+
+SYSTEM_INSTRUCTION = (
+    "You are an expert agricultural assistant specialized in helping farmers. "
+    "Your expertise includes: crop selection, soil management (NPK, pH), "
+    "pest/disease identification, irrigation, fertilizer recommendations, "
+    "yield optimization, seasonal practices, organic farming, and market information. "
+    "Always provide practical, actionable advice. Be friendly, clear, and concise. "
+    "Use simple language that farmers can easily understand."
+)
+
+# Tried in order until one answers; free tier models first
+DEFAULT_MODELS = (
+    "gemini-1.5-flash",
+    "gemini-pro",
+    "gemini-1.5-pro",
+    "gemini-2.5-flash",
+    "gemini-2.0-flash",
+    "gemini-flash-latest",
+)
+
+
+class ChatNotConfigured(Exception):
+    """The backend cannot be used at all (e.g. no API key)."""
+
+
+class ModelUnavailable(Exception):
+    """This model name does not exist or cannot be used with this key; try another."""
+
+
+class ChatBackend(Protocol):
+    name: str
+
+    def generate(self, model: str, message: str, history: list[dict[str, Any]]) -> str: ...
+
+    def stream(self, model: str, message: str, history: list[dict[str, Any]]) -> Iterator[str]: ...
+
+
+def history_turns(history: Iterable[Any]) -> list[tuple[str, str]]:
+    """(role, text) for the user/model turns of a frontend-style history; malformed entries are skipped."""
+    turns = []
+    for msg in history or []:
+        if not isinstance(msg, dict) or msg.get("role") not in ("user", "model"):
+            continue
+        try:
+            text = msg["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            continue
+        if isinstance(text, str):
+            turns.append((msg["role"], text))
+    return turns
+
+
+def _is_unavailable(error: Exception) -> bool:
+    # google.api_core errors carry the HTTP status as `code`
+    if getattr(error, "code", None) == 404 or type(error).__name__ == "NotFound":
+        return True
+    text = str(error).lower()
+    return "not found" in text or "not available" in text or "not supported" in text
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key: str | None):
+        if not api_key:
+            raise ChatNotConfigured(
+                "Gemini API key not configured. Please set GEMINI_API_KEY or "
+                "NEXT_PUBLIC_GEMINI_API_KEY environment variable."
+            )
+        import google.generativeai as genai
+
+        # Process-wide SDK state: configured once, not per request
+        genai.configure(api_key=api_key)
+        self._genai = genai
+
+    def _send(self, model: str, message: str, history: list[dict[str, Any]], stream: bool) -> Any:
+        genai = self._genai
+        chat_history = [{"role": role, "parts": [text]} for role, text in history_turns(history)]
+        try:
+            if chat_history:
+                chat = genai.GenerativeModel(model).start_chat(history=chat_history)
+                return chat.send_message(message, stream=stream)
+            try:
+                return genai.GenerativeModel(
+                    model_name=model, system_instruction=SYSTEM_INSTRUCTION
+                ).generate_content(message, stream=stream)
+            except Exception as e:
+                if _is_unavailable(e):
+                    raise
+                # Older models reject system_instruction; inline it instead
+                return genai.GenerativeModel(model).generate_content(
+                    f"{SYSTEM_INSTRUCTION}\n\nUser question: {message}", stream=stream
+                )
+        except Exception as e:
+            if _is_unavailable(e):
+                raise ModelUnavailable(str(e)) from e
+            raise
+
+    @staticmethod
+    def _text(response: Any) -> str:
+        try:
+            return response.text
+        except AttributeError:
+            if getattr(response, "candidates", None):
+                return response.candidates[0].content.parts[0].text
+            raise ValueError(f"Unexpected response format: {type(response)}")
+
+    def generate(self, model: str, message: str, history: list[dict[str, Any]]) -> str:
+        text = self._text(self._send(model, message, history, stream=False))
+        if not text:
+            raise ValueError("Empty response from model")
+        return text
+
+    def stream(self, model: str, message: str, history: list[dict[str, Any]]) -> Iterator[str]:
+        response = self._send(model, message, history, stream=True)
+        try:
+            for chunk in response:
+                try:
+                    text = self._text(chunk)
+                except ValueError:
+                    continue
+                if text:
+                    yield text
+        finally:
+            # Stopped early (client gone): cancel the underlying gRPC/HTTP
+            # stream instead of letting it run to completion
+            cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+            if cancel is not None:
+                cancel()
+
+
+class StubBackend:
+    """
+    Offline backend: echoes the question word by word, `delay_s` per word
+    (so a whole reply takes as long as streaming it); `unavailable` models
+    raise ModelUnavailable.
+    """
+
+    name = "stub"
+
+    def __init__(self, delay_s: float = 0.0, unavailable: Iterable[str] = ()):
+        self.delay_s = delay_s
+        self.unavailable = frozenset(unavailable)
+
+    def generate(self, model: str, message: str, history: list[dict[str, Any]]) -> str:
+        return "".join(self.stream(model, message, history))
+
+    def stream(self, model: str, message: str, history: list[dict[str, Any]]) -> Iterator[str]:
+        if model in self.unavailable:
+            raise ModelUnavailable(f"models/{model} is not found")
+        turn = len(history_turns(history)) // 2 + 1
+        reply = f"[offline assistant, {model}, turn {turn}] You asked: {message.strip()}"
+        for i, word in enumerate(reply.split(" ")):
+            if self.delay_s:
+                time.sleep(self.delay_s)
+            yield word if i == 0 else f" {word}"
@@ -0,0 +1,79 @@
+"""Reply cache for repeated first-turn questions ("how much urea for rice per acre")."""
+
+from __future__ import annotations
+
+import threading
+import unicodedata
+from typing import Any
+
+from ..cache import TTLCache
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping; it only has to map variants of a word to the same key."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "xes", "oes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def _word_char(ch: str) -> bool:
+    # Combining marks (e.g. Devanagari vowel signs) belong to their word
+    return ch.isalnum() or unicodedata.category(ch).startswith("M")
+
+
+def normalize_question(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive, lightly stemmed form of `text`."""
+    text = "".join(ch if _word_char(ch) else " " for ch in unicodedata.normalize("NFKC", text.casefold()))
+    return " ".join(_stem(word) for word in text.split())
+
+
+class FAQCache:
+    """
+    Bounded LRU of chat replies keyed on the normalized question, each kept
+    for `ttl` seconds. Remembers how long the upstream call for each reply
+    took, so hits can report the latency they saved.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.saved_seconds = 0.0
+        self.stored = 0
+
+    def get(self, question: str) -> Any | None:
+        key = normalize_question(question)
+        if not key:
+            return None
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        reply, upstream_seconds = entry
+        with self._lock:
+            self.saved_seconds += upstream_seconds
+        return reply
+
+    def set(self, question: str, reply: Any, upstream_seconds: float) -> None:
+        key = normalize_question(question)
+        if key:
+            self._cache.set(key, (reply, upstream_seconds))
+            self.stored += 1
+
+    def stats(self) -> dict[str, Any]:
+        stats = self._cache.stats()
+        return {
+            **stats,
+            "stored": self.stored,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "avg_saved_ms": round(self.saved_seconds / stats["hits"] * 1000, 1) if stats["hits"] else 0.0,
+        }
@@ -0,0 +1,254 @@
+"""Non-blocking access to a chat backend, with a memory of unavailable models."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Sequence
+
+from ..inference import InferenceExecutor, InferenceSaturated
+from .backends import ChatBackend, ModelUnavailable, history_turns
+from .faq import FAQCache
+
+# Queue marker: the pump thread has finished (its task holds any error)
+_DONE = object()
+
+
+class ChatSaturated(InferenceSaturated):
+    """The chat pool has no room for another reply."""
+
+
+class ChatFailed(Exception):
+    """Every candidate model failed (or is known to be unavailable), or a stream broke off."""
+
+
+@dataclass(frozen=True)
+class ChatReply:
+    text: str
+    model: str
+
+
+class ChatGateway:
+    """
+    Sends chat messages to the first model in `models` that answers.
+
+    The blocking backend call runs on `executor`, which bounds how many
+    calls run at once and how many may wait. The backend is created (and
+    the SDK configured) on first use only. Models that answer
+    `ModelUnavailable` are skipped for `unavailable_ttl` seconds, and the
+    last model that answered is tried first, so once the gateway has found a
+    working model later messages go straight to it. With a `faq_cache`,
+    first-turn messages (no history) are answered from it when the same
+    question was asked before.
+    """
+
+    def __init__(
+        self,
+        backend_factory: Callable[[], ChatBackend],
+        models: Sequence[str],
+        executor: InferenceExecutor,
+        unavailable_ttl: float = 600.0,
+        faq_cache: FAQCache | None = None,
+    ):
+        if not models:
+            raise ValueError("ChatGateway needs at least one model name")
+        self.models = tuple(models)
+        self.executor = executor
+        self.unavailable_ttl = unavailable_ttl
+        self.faq_cache = faq_cache
+        self._backend_factory = backend_factory
+        self._backend: ChatBackend | None = None
+        self._backend_lock = threading.Lock()
+        # model name -> (monotonic expiry, reason)
+        self._unavailable: dict[str, tuple[float, str]] = {}
+        self._preferred: str | None = None
+
+        self.replies = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.skipped = 0
+        self.streams = 0
+        self.cancelled = 0
+
+    def backend(self) -> ChatBackend:
+        """The backend, created on first call (may raise ChatNotConfigured, and then retries next time)."""
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = self._backend_factory()
+        return self._backend
+
+    def _available(self, model: str, now: float) -> bool:
+        entry = self._unavailable.get(model)
+        if entry is None:
+            return True
+        if entry[0] <= now:
+            self._unavailable.pop(model, None)
+            return True
+        return False
+
+    def candidates(self) -> list[str]:
+        """Models to try, preferred first, without the ones known to be unavailable."""
+        now = time.monotonic()
+        ordered = list(self.models)
+        if self._preferred in ordered:
+            ordered.remove(self._preferred)
+            ordered.insert(0, self._preferred)
+        available = [m for m in ordered if self._available(m, now)]
+        self.skipped += len(ordered) - len(available)
+        return available
+
+    def mark_unavailable(self, model: str, reason: str) -> None:
+        self._unavailable[model] = (time.monotonic() + self.unavailable_ttl, reason)
+        if self._preferred == model:
+            self._preferred = None
+
+    def _faq(self, history: list[dict[str, Any]]) -> FAQCache | None:
+        # Only first turns are context-free enough to share answers
+        return self.faq_cache if self.faq_cache is not None and not history_turns(history) else None
+
+    async def reply(self, message: str, history: list[dict[str, Any]]) -> ChatReply:
+        faq = self._faq(history)
+        if faq is not None and (cached := faq.get(message)) is not None:
+            return cached
+
+        started = time.perf_counter()
+        backend = await self.executor.run(self.backend)
+        last_error = None
+        for attempt, model in enumerate(self.candidates()):
+            try:
+                text = await self.executor.run(backend.generate, model, message, history)
+            except InferenceSaturated:
+                # The pool is full, not the model; other models would not help
+                raise
+            except ModelUnavailable as e:
+                self.mark_unavailable(model, str(e))
+                last_error = e
+            except Exception as e:
+                print(f"Error with model {model}: {e}")
+                last_error = e
+            else:
+                self._preferred = model
+                self.replies += 1
+                self.fallbacks += attempt > 0
+                reply = ChatReply(text, model)
+                if faq is not None:
+                    faq.set(message, reply, time.perf_counter() - started)
+                return reply
+
+        self.failures += 1
+        if last_error is None:
+            raise ChatFailed("All models are currently unavailable.")
+        raise ChatFailed(str(last_error))
+
+    @staticmethod
+    def _pump(
+        backend: ChatBackend,
+        model: str,
+        message: str,
+        history: list[dict[str, Any]],
+        queue: asyncio.Queue,
+        loop: asyncio.AbstractEventLoop,
+        stop: threading.Event,
+    ) -> None:
+        # Runs on the chat pool, holding one slot until the model finishes
+        # or the consumer goes away
+        chunks = backend.stream(model, message, history)
+        try:
+            for text in chunks:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, text)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    async def stream(self, message: str, history: list[dict[str, Any]]) -> AsyncIterator[ChatReply]:
+        """
+        Reply chunks as the model produces them. Falls back to the next model
+        only while nothing has been yielded; a failure after that raises
+        ChatFailed. Closing or cancelling the iterator (client disconnect)
+        stops the backend stream at its next chunk and frees the pool slot.
+        A cached first-turn reply comes back as a single chunk.
+        """
+        faq = self._faq(history)
+        if faq is not None and (cached := faq.get(message)) is not None:
+            yield cached
+            return
+
+        started = time.perf_counter()
+        backend = await self.executor.run(self.backend)
+        loop = asyncio.get_running_loop()
+        last_error = None
+        for attempt, model in enumerate(self.candidates()):
+            queue: asyncio.Queue = asyncio.Queue()
+            stop = threading.Event()
+            task = asyncio.ensure_future(
+                self.executor.run(self._pump, backend, model, message, history, queue, loop, stop)
+            )
+            # Runs after every chunk the pump queued, and also when admission fails
+            task.add_done_callback(lambda _: queue.put_nowait(_DONE))
+            sent = finished = False
+            parts: list[str] = []
+            try:
+                while (text := await queue.get()) is not _DONE:
+                    sent = True
+                    parts.append(text)
+                    yield ChatReply(text, model)
+                await task
+                finished = True
+            except InferenceSaturated:
+                raise
+            except Exception as e:
+                if isinstance(e, ModelUnavailable):
+                    self.mark_unavailable(model, str(e))
+                else:
+                    print(f"Error with model {model}: {e}")
+                if sent:
+                    self.failures += 1
+                    raise ChatFailed(str(e)) from e
+                last_error = e
+                continue
+            finally:
+                stop.set()
+                if not finished and not task.done():
+                    self.cancelled += 1
+                    # The pump exits at its next chunk; nobody awaits it any more
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+            self._preferred = model
+            self.replies += 1
+            self.streams += 1
+            self.fallbacks += attempt > 0
+            if faq is not None and parts:
+                faq.set(message, ChatReply("".join(parts), model), time.perf_counter() - started)
+            return
+
+        self.failures += 1
+        if last_error is None:
+            raise ChatFailed("All models are currently unavailable.")
+        raise ChatFailed(str(last_error))
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "backend": self._backend.name if self._backend is not None else None,
+            "models": list(self.models),
+            "preferred": self._preferred,
+            "unavailable": {
+                model: {"retry_in_s": round(until - now, 1), "reason": reason}
+                for model, (until, reason) in list(self._unavailable.items())
+                if until > now
+            },
+            "replies": self.replies,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "skipped": self.skipped,
+            "streams": self.streams,
+            "cancelled": self.cancelled,
+            "faq_cache": self.faq_cache.stats() if self.faq_cache is not None else None,
+            "executor": self.executor.stats(),
+        }
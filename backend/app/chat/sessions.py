@@ -0,0 +1,243 @@
+"""
+Server-side chat sessions.
+
+Instead of resending the whole transcript every turn, a client sends the
+`session_id` it got back from its first message and the server keeps the
+conversation. Each session holds only the most recent turns that fit the
+history token budget; older turns are folded into a short summary (the
+farmer's earlier questions), so the history sent upstream per turn stays
+flat however long the conversation gets.
+
+Sessions idle for longer than `idle_s` are evicted. `MemorySessionStore`
+keeps them in-process (bounded LRU); `DiskSessionStore` keeps one JSON
+file per session so they survive restarts and are shared by workers.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import secrets
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Protocol
+
+from ..cache import TTLCache
+
+# Rough chars-per-token ratio for budgeting (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+# Earlier questions are clipped to this many characters in the summary
+SUMMARY_QUESTION_CHARS = 120
+# Stores purge idle sessions at most this often, on access
+PURGE_INTERVAL_S = 60.0
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def valid_session_id(session_id: str | None) -> bool:
+    return bool(session_id) and _SESSION_ID.match(session_id) is not None
+
+
+@dataclass
+class ChatSession:
+    id: str
+    # (role, text) pairs, role "user" or "model", oldest first
+    turns: list[tuple[str, str]] = field(default_factory=list)
+    # Clipped user questions of turns trimmed off the front, oldest first
+    earlier: list[str] = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    updated: float = field(default_factory=time.time)
+
+    @classmethod
+    def new(cls) -> "ChatSession":
+        return cls(new_session_id())
+
+    def history(self) -> list[dict[str, Any]]:
+        """Turns in the request's conversation_history format, summary first."""
+        turns = list(self.turns)
+        if self.earlier:
+            summary = "Earlier in this conversation the farmer asked: " + "; ".join(self.earlier)
+            turns[:0] = [("user", summary), ("model", "Noted, I will keep that in mind.")]
+        return [{"role": role, "parts": [{"text": text}]} for role, text in turns]
+
+    def tokens(self) -> int:
+        return sum(estimate_tokens(text) for _, text in self.turns) + sum(estimate_tokens(q) for q in self.earlier)
+
+    def add_turn(self, message: str, reply: str, budget_tokens: int) -> None:
+        self.turns += [("user", message), ("model", reply)]
+        self.updated = time.time()
+        self.trim(budget_tokens)
+
+    def trim(self, budget_tokens: int) -> None:
+        """Fold the oldest turns into `earlier` until the session fits `budget_tokens` (latest turn always kept)."""
+        while len(self.turns) > 2 and self.tokens() > budget_tokens:
+            (_, question), _ = self.turns[0], self.turns[1]
+            del self.turns[:2]
+            question = " ".join(question.split())
+            if len(question) > SUMMARY_QUESTION_CHARS:
+                question = question[: SUMMARY_QUESTION_CHARS - 1] + "…"
+            self.earlier.append(question)
+        # The summary itself gets at most a quarter of the budget
+        while self.earlier and sum(estimate_tokens(q) for q in self.earlier) > budget_tokens // 4:
+            del self.earlier[0]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "turns": [list(turn) for turn in self.turns],
+            "earlier": self.earlier,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ChatSession":
+        return cls(
+            id=data["id"],
+            turns=[(role, text) for role, text in data.get("turns", [])],
+            earlier=list(data.get("earlier", [])),
+            created=float(data.get("created", time.time())),
+            updated=float(data.get("updated", time.time())),
+        )
+
+
+class SessionStore(Protocol):
+    def get(self, session_id: str) -> ChatSession | None: ...
+
+    def put(self, session: ChatSession) -> None: ...
+
+    def stats(self) -> dict[str, Any]: ...
+
+
+class MemorySessionStore:
+    """In-process sessions: at most `maxsize` (LRU), each evicted after `idle_s` without a turn."""
+
+    backend = "memory"
+
+    def __init__(self, maxsize: int = 10000, idle_s: float = 1800.0):
+        self.idle_s = idle_s
+        self._cache = TTLCache(maxsize=maxsize, ttl=idle_s)
+        self._last_purge = time.monotonic()
+
+    def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge >= PURGE_INTERVAL_S:
+            self._last_purge = time.monotonic()
+            self._cache.purge()
+
+    def get(self, session_id: str) -> ChatSession | None:
+        self._maybe_purge()
+        return self._cache.get(session_id)
+
+    def put(self, session: ChatSession) -> None:
+        # Setting again restarts the idle timer
+        self._cache.set(session.id, session)
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": self.backend, "idle_s": self.idle_s, **self._cache.stats()}
+
+
+class DiskSessionStore:
+    """One JSON file per session under `directory`; files idle for `idle_s` are deleted."""
+
+    backend = "disk"
+
+    def __init__(self, directory: str | Path, idle_s: float = 1800.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.idle_s = idle_s
+        self._last_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def _path(self, session_id: str) -> Path:
+        return self.directory / f"{session_id}.json"
+
+    def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL_S:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = time.time() - self.idle_s
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    self.expirations += 1
+            except OSError:
+                pass
+
+    def get(self, session_id: str) -> ChatSession | None:
+        self._maybe_purge()
+        path = self._path(session_id)
+        try:
+            if path.stat().st_mtime < time.time() - self.idle_s:
+                raise FileNotFoundError
+            with open(path) as f:
+                session = ChatSession.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return session
+
+    def put(self, session: ChatSession) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(session.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self._path(session.id))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "idle_s": self.idle_s,
+            "directory": str(self.directory),
+            "size": sum(1 for _ in self.directory.glob("*.json")),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expirations": self.expirations,
+        }
+
+
+def make_store(directory: str, maxsize: int, idle_s: float) -> SessionStore:
+    """Disk store under `directory` when one is given, else in memory."""
+    if directory:
+        return DiskSessionStore(directory, idle_s)
+    return MemorySessionStore(maxsize, idle_s)
+
+
+def open_session(
+    store: SessionStore, session_id: str | None, history: list[Any]
+) -> tuple[ChatSession | None, list[Any]]:
+    """
+    The session for this turn and the history to send upstream. A request
+    carrying its own conversation_history and no session_id stays stateless
+    (None). Unknown, expired or malformed ids start a fresh session with a
+    new server-generated id, so clients can never pick their own.
+    """
+    if session_id is None and history:
+        return None, history
+    session = store.get(session_id) if valid_session_id(session_id) else None
+    if session is None:
+        session = ChatSession.new()
+    return session, session.history()
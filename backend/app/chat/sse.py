@@ -0,0 +1,50 @@
+"""Server-sent events framing for streamed chat replies."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+from typing import Any, AsyncIterator
+
+from starlette.requests import Request
+
+# Sent with every event stream: no caching, and no proxy buffering (nginx)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One SSE event; `data` is JSON-encoded so newlines in text stay inside a single data line."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def _disconnected(request: Request) -> None:
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def until_disconnect(request: Request, events: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Relay `events` until the client goes away, then cancel and close it.
+
+    Servers on ASGI spec 2.4 (uvicorn) drop writes to a closed connection
+    without raising, so StreamingResponse alone would keep pulling events
+    (and keep the model generating) until the reply is complete.
+    """
+    disconnected = asyncio.ensure_future(_disconnected(request))
+    try:
+        while True:
+            step = asyncio.ensure_future(anext(events))
+            await asyncio.wait({step, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                step.cancel()
+                with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                    await step
+                return
+            try:
+                yield step.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        disconnected.cancel()
+        await events.aclose()
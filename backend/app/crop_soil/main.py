@@ -1,10 +1,12 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Request
 from fastapi.responses import JSONResponse
-from app.model.predictor import predict
-from app.model.loader import load_model
-from app.model.config import Class_name
-from PIL import Image
-import io
+from .model.batcher import SoilBatcher
+from .model.preprocess import ImageTooLarge, load_pixels
+from .model.loader import load_model
+from .model.config import Class_name
+from .. import settings
+from ..uploads import FORM_OVERHEAD_BYTES, UploadLimitMiddleware, read_upload
+import asyncio
 import torch
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional, Dict, Any
@@ -19,6 +21,9 @@ async def generic_exception_handler(request: Request, exc: Exception):
         content={"detail": traceback.format_exc()}
     )
 
+# Photo uploads are capped while the body streams in, before multipart parsing
+app.add_middleware(UploadLimitMiddleware, limits={"/uploadfile/": settings.UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:8080", "http://localhost:5173"],
@@ -34,6 +39,15 @@ model, class_names = load_model(model_path="soil_classifier_model.pt",
 model.to(device)
 model.eval()
 
+soil_batcher = SoilBatcher(
+    model,
+    device,
+    Class_name,
+    max_batch_size=settings.SOIL_BATCH_MAX_SIZE,
+    max_wait_ms=settings.SOIL_BATCH_MAX_WAIT_MS,
+    max_queue=settings.SOIL_BATCH_MAX_QUEUE,
+)
+
 import joblib
 import numpy as np
 from pydantic import BaseModel
@@ -59,10 +73,22 @@ async def root():
 @app.post("/uploadfile/")
 async def upload_file(file: UploadFile = File(...)):
 
-    contents = await file.read()
-    image = Image.open(io.BytesIO(contents))
-
-    predicted_class, confidence = predict(model, device, image, Class_name)
+    contents = await read_upload(file, settings.UPLOAD_MAX_BYTES)
+    try:
+        pixels = load_pixels(contents, settings.UPLOAD_MAX_PIXELS)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=f"Image too large: {e}")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    try:
+        predicted_class, confidence = await soil_batcher.submit(pixels)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy classifying other photos, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
 
     return {
         "predicted class": predicted_class,
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .predictor import predict_batch
+from .preprocess import INPUT_SIZE, image_to_pixels, pixels_to_tensor
+
+
+class SoilBatcher:
+    """
+    Dynamic micro-batching queue in front of the soil classifier.
+
+    Concurrent callers of `submit()` are collected for up to `max_wait_ms`
+    (or until `max_batch_size` images are waiting), classified with a single
+    stacked forward pass, and each caller gets its own (class, confidence).
+    When `max_queue` images are already waiting, `submit()` raises
+    `asyncio.QueueFull` instead of growing the backlog. `on_batch` is called
+    with the size and seconds of every successful forward pass.
+    """
+
+    def __init__(
+        self,
+        model,
+        device,
+        class_names: list,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 0,
+        run_in_executor: Callable[..., Any] | None = None,
+        on_batch: Callable[[int, float], None] | None = None,
+    ):
+        self.model = model
+        self.device = device
+        self.class_names = class_names
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(0, int(max_queue))
+        self._run_in_executor = run_in_executor
+        self._on_batch = on_batch
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        # Reused for every forward pass; batches run one at a time
+        self._buffer = torch.empty((self.max_batch_size, 3, *INPUT_SIZE), dtype=torch.float32)
+
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes: Counter[int] = Counter()
+        self._last_batch_ms = 0.0
+
+    async def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.create_task(self._run(), name="soil-batcher")
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        # Fail anything still queued so no handler waits forever
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Soil batcher stopped"))
+        self._queue = None
+
+    async def submit(self, image: Image.Image | np.ndarray) -> tuple[str, float]:
+        """
+        Queue one image and wait for its (predicted_class, confidence_pct).
+        Accepts a PIL image or (224, 224, 3) uint8 pixels from `load_pixels`.
+        """
+        if self._worker is None:
+            await self.start()
+
+        pixels = image if isinstance(image, np.ndarray) else image_to_pixels(image)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((pixels, future))
+        return await future
+
+    async def _collect(self, batch: list[tuple[np.ndarray, asyncio.Future]]) -> None:
+        """Fill `batch` in place, so items taken from the queue are still reachable if cancelled."""
+        batch.append(await self._queue.get())
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Grab whatever is already waiting before considering the timer
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        batch: list[tuple[np.ndarray, asyncio.Future]] = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                await self._process(batch)
+        finally:
+            # Cancelled by stop() while collecting or mid-forward-pass: fail the
+            # batch in hand, since nothing else will ever resolve its futures
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Soil batcher stopped"))
+
+    async def _process(self, batch: list[tuple[np.ndarray, asyncio.Future]]) -> None:
+        # Callers that gave up (client disconnect) don't need a slot
+        batch = [(p, f) for p, f in batch if not f.done()]
+        if not batch:
+            return
+
+        stacked = pixels_to_tensor([p for p, _ in batch], out=self._buffer)
+        started = time.perf_counter()
+        try:
+            if self._run_in_executor is not None:
+                results = await self._run_in_executor(
+                    predict_batch, self.model, self.device, stacked, self.class_names
+                )
+            else:
+                results = await asyncio.to_thread(
+                    predict_batch, self.model, self.device, stacked, self.class_names
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        self._last_batch_ms = elapsed * 1000
+        self._batches += 1
+        self._items += len(batch)
+        self._batch_sizes[len(batch)] += 1
+        if self._on_batch is not None:
+            self._on_batch(len(batch), elapsed)
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._worker is not None,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 3) if self._batches else 0.0,
+            "batch_sizes": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "last_batch_ms": round(self._last_batch_ms, 3),
+        }
@@ -3,7 +3,7 @@ from torchvision import models
 import torch.nn as nn
 from pathlib import Path
 
-def load_model(model_path: str, num_classes: int):
+def load_model(model_path: str, num_classes: int, mmap: bool = True):
 
     model_path = Path(model_path)
     if not model_path.exists():
@@ -12,6 +12,25 @@ def load_model(model_path: str, num_classes: int):
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+    if mmap and device.type == "cpu":
+        # Weights stay in the page-cached checkpoint file and are shared by
+        # every process that loads it: the state dict is memory-mapped and
+        # assigned to a model built on the meta device, so no private copy
+        # of the parameters is ever allocated.
+        try:
+            state_dict = torch.load(model_path, map_location=device, mmap=True, weights_only=True)
+        except RuntimeError:
+            # Legacy (non-zipfile) checkpoints cannot be memory-mapped
+            state_dict = None
+        if state_dict is not None:
+            with torch.device("meta"):
+                model = models.mobilenet_v3_large(weights = None)
+                num_ftrs = model.classifier[-1].in_features
+                model.classifier[-1] = nn.Linear(num_ftrs , num_classes)
+            model.load_state_dict(state_dict, assign=True)
+            model.eval()
+            return model, device
+
     model = models.mobilenet_v3_large(weights = None)
     num_ftrs = model.classifier[-1].in_features
     model.classifier[-1] = nn.Linear(num_ftrs , num_classes)
@@ -20,4 +39,4 @@ def load_model(model_path: str, num_classes: int):
     model = model.to(device)
     model.eval()
 
-    return model, device
\ No newline at end of file
+    return model, device
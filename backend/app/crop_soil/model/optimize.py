@@ -0,0 +1,178 @@
+"""
+Optimized CPU inference modes for the soil classifier.
+
+    none     eager float32 model as loaded (default)
+    jit      channels-last float32, traced and frozen with torch.jit
+    dynamic  int8 dynamic quantization of the Linear layers, then jit
+    static   int8 static (post-training) quantization of the whole network
+             with FX graph mode, calibrated on sample photos, then jit
+
+Optimized models are saved as TorchScript next to the checkpoint
+(soil_classifier_model.pt -> soil_classifier_model.jit.ts, ...) together
+with the checkpoint's sha256, and rebuilt when the checkpoint changes.
+`static` needs calibration photos to build; without a cached artifact or
+calibration images it raises instead of calibrating on noise.
+
+Check accuracy and latency before enabling a mode:
+
+    python -m backend.benchmarks.soil_optimize --holdout path/to/holdout
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import warnings
+from pathlib import Path
+from typing import Callable, Iterable
+
+import torch
+import torch.nn as nn
+
+from .preprocess import INPUT_SIZE
+
+MODES = ("none", "jit", "dynamic", "static")
+
+# Images per calibration forward pass for static quantization
+CALIBRATION_BATCH = 8
+
+
+class ChannelsLast(nn.Module):
+    """Converts inputs to channels-last so it is baked into the traced graph."""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def artifact_path(model_path: str | Path, mode: str) -> Path:
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}.{mode}.ts")
+
+
+def _sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _example_input(batch: int = 1) -> torch.Tensor:
+    return torch.zeros((batch, 3, *INPUT_SIZE), dtype=torch.float32)
+
+
+def _freeze(model: nn.Module) -> torch.jit.ScriptModule:
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), _example_input())
+        return torch.jit.freeze(traced)
+
+
+def _for_inference(frozen: torch.jit.ScriptModule) -> torch.jit.ScriptModule:
+    # The result embeds constants TorchScript cannot serialize, so this runs
+    # after saving/loading the frozen module, never before
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return torch.jit.optimize_for_inference(frozen)
+
+
+def _dynamic(model: nn.Module) -> nn.Module:
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def _static(model: nn.Module, calibration: Iterable[torch.Tensor]) -> nn.Module:
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else torch.backends.quantized.engine
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(model.eval(), get_default_qconfig_mapping(engine), (_example_input(),))
+    seen = 0
+    with torch.inference_mode():
+        for batch in calibration:
+            prepared(batch)
+            seen += len(batch)
+    if seen == 0:
+        raise ValueError("static quantization needs calibration images")
+    return convert_fx(prepared)
+
+
+def optimize(
+    model: nn.Module,
+    mode: str,
+    calibration: Iterable[torch.Tensor] | None = None,
+) -> torch.jit.ScriptModule:
+    """Build the frozen TorchScript module for `mode` from an eager float model (left untouched)."""
+    model = copy.deepcopy(model).eval()
+    with warnings.catch_warnings():
+        # torch.ao.quantization warns that it is moving to torchao
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        warnings.simplefilter("ignore", FutureWarning)
+        if mode == "jit":
+            return _freeze(ChannelsLast(model.to(memory_format=torch.channels_last)))
+        if mode == "dynamic":
+            return _freeze(_dynamic(model))
+        if mode == "static":
+            if calibration is None:
+                raise ValueError("static quantization needs calibration images (SOIL_CALIBRATION_DIR)")
+            return _freeze(_static(model, calibration))
+    raise ValueError(f"Unknown soil model optimization '{mode}', expected one of {MODES}")
+
+
+def load_optimized(
+    model: nn.Module,
+    model_path: str | Path,
+    mode: str,
+    calibration: Callable[[], Iterable[torch.Tensor]] | None = None,
+    rebuild: bool = False,
+) -> nn.Module:
+    """
+    The optimized module for `mode`, from the cached artifact next to
+    `model_path` when it matches the checkpoint, otherwise built from the
+    eager `model` and cached (best effort). `calibration` is only called
+    when a static artifact has to be built. Mode "none" returns `model`.
+    """
+    if mode == "none":
+        return model
+
+    path = artifact_path(model_path, mode)
+    digest = _sha256(model_path)
+    if path.exists() and not rebuild:
+        extra = {"source_sha256": ""}
+        optimized = torch.jit.load(str(path), map_location="cpu", _extra_files=extra)
+        saved = extra["source_sha256"]
+        if (saved.decode() if isinstance(saved, bytes) else saved) == digest:
+            return _for_inference(optimized)
+
+    optimized = optimize(model, mode, calibration() if calibration is not None else None)
+    try:
+        torch.jit.save(optimized, str(path), _extra_files={"source_sha256": digest})
+    except OSError:
+        pass
+    return _for_inference(optimized)
+
+
+def calibration_batches(directory: str | Path, limit: int = 256) -> list[torch.Tensor]:
+    """Preprocessed (N, 3, 224, 224) batches from up to `limit` photos under `directory`."""
+    from .preprocess import load_pixels, pixels_to_tensor
+
+    pixels = []
+    for path in sorted(Path(directory).rglob("*")):
+        if len(pixels) >= limit:
+            break
+        if not path.is_file():
+            continue
+        try:
+            pixels.append(load_pixels(path.read_bytes()))
+        except Exception:
+            continue
+    return [
+        pixels_to_tensor(pixels[start:start + CALIBRATION_BATCH])
+        for start in range(0, len(pixels), CALIBRATION_BATCH)
+    ]
@@ -1,30 +1,36 @@
 import torch
-from torchvision import transforms
 from PIL import Image
 
 from .config import Class_name
+from .preprocess import image_to_pixels, pixels_to_tensor
 
-def predict(model,device,image: Image.Image, class_names: list):
 
-    image = image.convert("RGB")
+def image_to_tensor(image: Image.Image) -> torch.Tensor:
+    """Convert a PIL image into a normalized (3, 224, 224) tensor."""
+
+    return pixels_to_tensor([image_to_pixels(image)])[0]
 
-    transform = transforms.Compose([
-        transforms.Resize((224,224)),
-            transforms.ToTensor(),
-            transforms.Normalize((0.5, 0.5, 0.5),
-                                 (0.5, 0.5, 0.5))
-        ])
 
-    image_tensor = transform(image)
-    image_tensor = image_tensor.unsqueeze(0).to(device)
+def predict_batch(model, device, image_tensors: torch.Tensor, class_names: list):
+    """Classify a stacked (N, 3, 224, 224) batch in one forward pass."""
 
+    image_tensors = image_tensors.to(device)
 
-    with torch.no_grad():
-        outputs = model(image_tensor)
+    with torch.inference_mode():
+        outputs = model(image_tensors)
         probabilities = torch.softmax(outputs, dim=1)
-        confidence, predicted_idx = torch.max(probabilities, 1)
+        confidences, predicted_idx = torch.max(probabilities, 1)
+
+    return [
+        (class_names[idx], conf * 100)
+        for idx, conf in zip(predicted_idx.tolist(), confidences.tolist())
+    ]
+
+
+def predict(model,device,image: Image.Image, class_names: list):
+
+    image_tensor = image_to_tensor(image).unsqueeze(0)
 
-    predicted_class = Class_name[predicted_idx.item()]
-    confidence = confidence.item() * 100
+    predicted_class, confidence = predict_batch(model, device, image_tensor, class_names)[0]
 
-    return predicted_class, confidence
\ No newline at end of file
+    return predicted_class, confidence
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import io
+
+import numpy as np
+import torch
+from PIL import Image
+
+# MobileNetV3 input resolution the classifier was trained on
+INPUT_SIZE = (224, 224)
+
+# JPEGs are DCT-scaled during decode to the smallest 1/2, 1/4 or 1/8 size that
+# is still at least this big, so a 12 MP phone photo never fully decodes.
+# Keeping 2x headroom over INPUT_SIZE leaves the final bilinear resize close
+# to what a full decode would produce.
+DRAFT_SIZE = (INPUT_SIZE[0] * 2, INPUT_SIZE[1] * 2)
+
+
+class ImageTooLarge(ValueError):
+    """The image would decode to more pixels than allowed."""
+
+
+def open_image(
+    data: bytes,
+    draft_size: tuple[int, int] | None = DRAFT_SIZE,
+    max_pixels: int | None = None,
+) -> Image.Image:
+    """
+    Open encoded image bytes, asking the JPEG decoder for a reduced-size
+    draft. Only the header has been read at this point, so `max_pixels`
+    rejects oversized images (after drafting) before anything is decoded.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    if draft_size is not None and image.format == "JPEG":
+        image.draft("RGB", draft_size)
+    if max_pixels is not None and image.size[0] * image.size[1] > max_pixels:
+        raise ImageTooLarge(f"image is {image.size[0]}x{image.size[1]} pixels, at most {max_pixels} allowed")
+    return image
+
+
+def image_to_pixels(image: Image.Image) -> np.ndarray:
+    """Resize to the model input and return a (224, 224, 3) uint8 array."""
+    image = image.convert("RGB")
+    # Same call torchvision's Resize((224, 224)) makes for PIL images
+    image = image.resize(INPUT_SIZE[::-1], Image.BILINEAR)
+    return np.array(image, dtype=np.uint8)
+
+
+def load_pixels(data: bytes, max_pixels: int | None = None) -> np.ndarray:
+    """Decode image bytes straight to model-sized uint8 pixels."""
+    return image_to_pixels(open_image(data, max_pixels=max_pixels))
+
+
+def pixels_to_tensor(pixels: list[np.ndarray], out: torch.Tensor | None = None) -> torch.Tensor:
+    """
+    Write a list of (224, 224, 3) uint8 arrays into an (N, 3, 224, 224) float tensor.
+    Matches ToTensor() + Normalize((0.5,)*3, (0.5,)*3) without per-image temporaries.
+    """
+    n = len(pixels)
+    if out is None:
+        out = torch.empty((n, 3, *INPUT_SIZE), dtype=torch.float32)
+    else:
+        out = out[:n]
+
+    for i, arr in enumerate(pixels):
+        out[i].copy_(torch.from_numpy(arr).permute(2, 0, 1))
+
+    return out.div_(255).sub_(0.5).div_(0.5)
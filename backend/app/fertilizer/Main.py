@@ -3,7 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
 import numpy as np
-from fertilizer_logic import fertilizer_recommendation
+from fertilizer_logic import all_state_recommendations, fertilizer_recommendation
 
 app = FastAPI()
 
@@ -26,6 +26,12 @@ async def root():
     return {"health check": "ok"}
 
 
+@app.get("/recommend/states")
+def recommend_all_states():
+    states = all_state_recommendations()
+    return {"count": len(states), "states": states}
+
+
 @app.post("/recommend")
 def recommend_fertilizer(data: FertilizerInput):
     if data.state is None and data.sample is None:
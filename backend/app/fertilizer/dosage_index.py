@@ -0,0 +1,96 @@
+"""
+Immutable fertilizer dosage index, built once from dosage_recommendation.csv.
+
+Names are matched case-, whitespace- and underscore-insensitively, so
+"Urea", "urea " and "UREA" all hit the same row and "npk_complex" matches
+"npk complex". Names the CSV does not carry directly fall back to an alias
+(see DosageIndex.DEFAULTS).
+Only the stdlib is used so lookups never touch pandas.
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Iterable, Mapping
+
+# Recommendation names that never need a dosage
+NO_DOSAGE = {"no fertilizer needed", "no recommendation", "no micronutrient needed"}
+
+
+@dataclass(frozen=True)
+class Dosage:
+    name: str
+    text: str
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(re.split(r"[\s_]+", str(name).strip().lower())).strip()
+
+
+class DosageIndex:
+    """
+    O(1) dosage lookup. `lookup()` tries the normalized name first, then the
+    alias chain: MOP falls back to a standard rate, and "npk complex" falls
+    back to the first Fourteen/Seventeen/Twenty grade in the CSV and then to
+    a standard rate.
+    """
+
+    # Standard rates used when the CSV has no row for these names
+    DEFAULTS = {
+        "mop": "50-100 kg/ha",  # Muriate of Potash
+        "npk complex": "150-200 kg/ha",
+    }
+    NPK_GRADE = re.compile(r"Fourteen|Seventeen|Twenty", re.IGNORECASE)
+
+    def __init__(self, rows: Iterable[tuple[str, str]]):
+        entries: dict[str, Dosage] = {}
+        npk_grade: Dosage | None = None
+        for name, text in rows:
+            key = normalize_name(name)
+            if not key or key in entries:
+                continue
+            entries[key] = Dosage(name, text)
+            if npk_grade is None and self.NPK_GRADE.search(name):
+                npk_grade = entries[key]
+
+        aliases: dict[str, Dosage] = {}
+        for key, text in self.DEFAULTS.items():
+            aliases[key] = Dosage(key, text)
+        if npk_grade is not None:
+            aliases["npk complex"] = npk_grade
+
+        self.entries: Mapping[str, Dosage] = MappingProxyType(entries)
+        self.aliases: Mapping[str, Dosage] = MappingProxyType(aliases)
+
+    @classmethod
+    def from_csv(cls, path: str | Path) -> "DosageIndex":
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = [(row.get("fertilizers") or "", row.get("Dosage") or "") for row in reader]
+        return cls(rows)
+
+    @classmethod
+    def empty(cls) -> "DosageIndex":
+        return cls([])
+
+    def lookup(self, name: str) -> Dosage | None:
+        key = normalize_name(name)
+        return self.entries.get(key) or self.aliases.get(key)
+
+    def dosage_list(self, names: Iterable[str]) -> list[dict[str, str]]:
+        """[{name: dosage text}, ...] for each name that has a dosage, in order."""
+        dosage = []
+        for name in names:
+            if normalize_name(name) in NO_DOSAGE:
+                continue
+            entry = self.lookup(name)
+            if entry is not None:
+                dosage.append({name: entry.text})
+        return dosage
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -1,9 +1,13 @@
 import pickle
+from dataclasses import dataclass
+from types import MappingProxyType
 import numpy as np
 import pandas as pd
+from dosage_index import DosageIndex
+from npk_table import NPKTable
 
 df = pd.read_csv("state_soil_summary.csv")
-dr = pd.read_csv("dosage_recommendation.csv")
+dosage_index = DosageIndex.from_csv("dosage_recommendation.csv")
 
 try:
     with open("fertilizer_model.pkl", "rb") as f:
@@ -11,35 +15,40 @@ try:
 except:
     model = None
 
+try:
+    npk_table = NPKTable.load("npk_table", model_path="fertilizer_model.pkl")
+except (OSError, ValueError, KeyError) as e:
+    print(f"NPK lookup table not used: {e}")
+    npk_table = None
+
+
+DEFICIENCY_COLUMNS = ["N", "P", "K", "OC", "B", "Cu", "Fe", "Mn", "S", "Zn"]
+
+
+def normalize_state(state: str) -> str:
+    return " ".join(str(state).split()).casefold()
+
 
 def detect_deficiency(state: str):
-    column = ["N", "P", "K", "OC", "B", "Cu", "Fe", "Mn", "S", "Zn"]
-    row = df.loc[df["State/UT"] == state]
+    row = state_deficiencies.get(normalize_state(state))
 
-    if row.empty:
+    if row is None:
         raise ValueError(f"State '{state}' not found in dataset.")
 
-    deficiency = []
-    for col in column:
-        value = row[col].iloc[0]
-        deficiency.append(value)
-
-    return deficiency
+    return list(row)
 
 
 def fertilizer_recommendation(state: str = None, sample: np.ndarray = None):
     if state is None and sample is None:
         raise ValueError("Either state or sample must be provided.")
 
-    if sample is not None and model is not None:
+    if sample is not None and (model is not None or npk_table is not None):
         # ML path — sample (N, P, K) takes priority
         fertilizer = ml_fertilizer(sample)
         micronutrients = ["no_micronutrient_needed"]  # no micro data from NPK alone
     else:
-        # Rule-based path — state given
-        deficiency = detect_deficiency(state)
-        fertilizer = generalized_fertilizers(deficiency)
-        micronutrients = generalized_micronutrients(deficiency)
+        # Rule-based path — state given, served from the precomputed table
+        return lookup_state(state).as_dict()
 
     dosage = get_dosage(fertilizer, micronutrients)
 
@@ -51,7 +60,14 @@ def fertilizer_recommendation(state: str = None, sample: np.ndarray = None):
 
 
 def ml_fertilizer(sample: np.ndarray):
+    # Integer in-range samples are answered from the precomputed table
+    top = npk_table.lookup(*np.ravel(sample)[:3]) if npk_table is not None else None
+    if top is not None:
+        return {name: f"{round(p * 100, 2)}%" for name, p in top}
+
     if model is None:
+        if npk_table is not None:
+            raise ValueError("ML model not loaded; only integer N, P, K within the lookup table are supported.")
         raise ValueError("ML model not loaded.")
 
     proba = model.predict_proba(sample)[0]
@@ -135,18 +151,61 @@ def generalized_micronutrients(deficiency: list):
 
 
 def get_dosage(fertilizer, micronutrients):
-    dosage = []
-
     items = list(fertilizer.keys()) if isinstance(fertilizer, dict) else fertilizer
 
-    for fert in items:
-        if fert in dr["fertilizers"].values:
-            value = dr.loc[dr["fertilizers"] == fert, "Dosage"].iloc[0]
-            dosage.append({fert: value})
+    return dosage_index.dosage_list(list(items) + list(micronutrients))
+
+
+@dataclass(frozen=True)
+class StateRecommendation:
+    state: str
+    fertilizer: tuple
+    micronutrients: tuple
+    dosage: tuple
+
+    def as_dict(self) -> dict:
+        return {
+            "fertilizer": list(self.fertilizer),
+            "micronutrients": list(self.micronutrients),
+            "dosage": [dict(d) for d in self.dosage],
+        }
+
+
+def build_state_table(summary: pd.DataFrame):
+    """
+    Deficiency rows and full rule-based recommendations for every state,
+    keyed by normalized state name. Built once; both mappings are read-only.
+    """
+    deficiencies = {}
+    recommendations = {}
+    for row in summary.to_dict("records"):
+        state = str(row["State/UT"]).strip()
+        key = normalize_state(state)
+        if key in deficiencies:
+            continue
+
+        deficiency = tuple(row[col] for col in DEFICIENCY_COLUMNS)
+        fertilizer = generalized_fertilizers(list(deficiency))
+        micronutrients = generalized_micronutrients(list(deficiency))
+        deficiencies[key] = deficiency
+        recommendations[key] = StateRecommendation(
+            state=state,
+            fertilizer=tuple(fertilizer),
+            micronutrients=tuple(micronutrients),
+            dosage=tuple(MappingProxyType(d) for d in get_dosage(fertilizer, micronutrients)),
+        )
+    return MappingProxyType(deficiencies), MappingProxyType(recommendations)
+
+
+def lookup_state(state: str) -> StateRecommendation:
+    recommendation = state_recommendations.get(normalize_state(state))
+    if recommendation is None:
+        raise ValueError(f"State '{state}' not found in dataset.")
+    return recommendation
+
+
+def all_state_recommendations() -> list:
+    return [{"state": r.state, **r.as_dict()} for r in state_recommendations.values()]
 
-    for micro in micronutrients:
-        if micro in dr["fertilizers"].values:
-            value = dr.loc[dr["fertilizers"] == micro, "Dosage"].iloc[0]
-            dosage.append({micro: value})
 
-    return dosage
\ No newline at end of file
+state_deficiencies, state_recommendations = build_state_table(df)
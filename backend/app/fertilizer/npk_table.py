@@ -0,0 +1,247 @@
+"""
+Precomputed decision surface of the [N, P, K] fertilizer classifier.
+
+Soil test kits report N, P and K as small non-negative integers, so the
+classifier only ever sees a bounded integer cube. `build_table` evaluates
+the model once over that whole cube and keeps the top-3 classes per cell
+(uint8 class indices + float32 probabilities). `NPKTable.load` memory-maps
+the saved arrays read-only, so lookups are plain indexing and every worker
+process shares the same page-cache copy. float32 keeps more precision than
+the responses print, so a table hit formats exactly like a model call.
+
+Samples outside the cube or with fractional values are not covered;
+`lookup` returns None for them and the caller falls back to the model.
+
+The backend builds the table from the loaded model on the first start
+after the model file changes (see NPK_TABLE_AUTOBUILD). To build it ahead
+of time instead:
+
+    python -m backend.app.fertilizer.npk_table backend/app/fertilizer/fertilizer_model.pkl
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Sequence
+
+import numpy as np
+
+TOP_K = 3
+CLASSES_FILE = "top_classes.npy"
+PROBA_FILE = "top_proba.npy"
+META_FILE = "meta.json"
+
+# Default cube bounds (inclusive), covering the kit ranges seen in the training data
+DEFAULT_UPPER = (140, 145, 205)
+
+PROBA_DTYPE = np.float32
+
+# Model rows evaluated per predict_proba call while building
+_BUILD_CHUNK_ROWS = 1 << 16
+
+
+def file_digest(path: str | Path) -> str:
+    # Same digest as forest.file_sha256, kept local because fertilizer_logic.py
+    # imports this module on its own, outside the backend.app package
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _top_k(proba: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Same ordering as np.argsort(row)[::-1][:3] on each row
+    order = np.argsort(proba, axis=1)[:, ::-1][:, :TOP_K]
+    return order, np.take_along_axis(proba, order, axis=1)
+
+
+class NPKTable:
+    def __init__(
+        self,
+        classes: Sequence[Any],
+        lower: Sequence[int],
+        upper: Sequence[int],
+        top_classes: np.ndarray,
+        top_proba: np.ndarray,
+        model_sha256: str | None = None,
+    ):
+        self.classes = [str(c) for c in classes]
+        self.lower = np.asarray(lower, dtype=np.int64)
+        self.upper = np.asarray(upper, dtype=np.int64)
+        self._lower = self.lower.tolist()
+        self._upper = self.upper.tolist()
+        self.top_classes = top_classes
+        self.top_proba = top_proba
+        self.model_sha256 = model_sha256
+
+        expected = tuple(int(n) for n in self.upper - self.lower + 1) + (TOP_K,)
+        if top_classes.shape != expected or top_proba.shape != expected:
+            raise ValueError(f"NPK table arrays have shape {top_classes.shape}, expected {expected}")
+        if top_proba.dtype != PROBA_DTYPE:
+            raise ValueError(f"NPK table probabilities are {top_proba.dtype}, expected {np.dtype(PROBA_DTYPE)}")
+
+    def _cells(self, samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(covered mask, integer cube offsets) for an (n, 3) array of samples."""
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, 3)
+        rounded = np.rint(samples)
+        covered = (
+            np.all(rounded == samples, axis=1)
+            & np.all(rounded >= self.lower, axis=1)
+            & np.all(rounded <= self.upper, axis=1)
+        )
+        offsets = np.where(covered[:, None], rounded, self.lower).astype(np.int64) - self.lower
+        return covered, offsets
+
+    def lookup(self, N: float, P: float, K: float) -> list[tuple[str, float]] | None:
+        """Top-3 (class, probability) for one sample, or None if it is not in the cube."""
+        cell = []
+        for value, lo, hi in zip((N, P, K), self._lower, self._upper):
+            value = float(value)
+            if not (value.is_integer() and lo <= value <= hi):
+                return None
+            cell.append(int(value) - lo)
+        n, p, k = cell
+        return [
+            (self.classes[c], prob)
+            for c, prob in zip(self.top_classes[n, p, k].tolist(), self.top_proba[n, p, k].tolist())
+        ]
+
+    def lookup_many(self, samples: np.ndarray) -> list[list[tuple[str, float]] | None]:
+        covered, offsets = self._cells(samples)
+        n, p, k = offsets.T
+        top_classes = self.top_classes[n, p, k].tolist()
+        top_proba = self.top_proba[n, p, k].tolist()
+        return [
+            [(self.classes[c], prob) for c, prob in zip(top_classes[i], top_proba[i])]
+            if covered[i] else None
+            for i in range(len(covered))
+        ]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "cells": int(np.prod(self.upper - self.lower + 1)),
+            "classes": len(self.classes),
+            "bytes": int(self.top_classes.nbytes + self.top_proba.nbytes),
+            "mmap": isinstance(self.top_classes, np.memmap),
+        }
+
+    def save(self, directory: str | Path) -> None:
+        """
+        Write the arrays and meta.json next to `directory` and rename them into
+        place, so workers building at the same time never load a mixed set.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+        try:
+            np.save(staging / CLASSES_FILE, self.top_classes)
+            np.save(staging / PROBA_FILE, self.top_proba)
+            meta = {
+                "classes": self.classes,
+                "lower": self.lower.tolist(),
+                "upper": self.upper.tolist(),
+                "model_sha256": self.model_sha256,
+            }
+            (staging / META_FILE).write_text(json.dumps(meta, indent=2))
+            if directory.exists():
+                shutil.rmtree(directory)
+            os.replace(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory: str | Path, model_path: str | Path | None = None) -> "NPKTable | None":
+        """
+        Memory-map a saved table, or return None if there is none. When
+        `model_path` is given the table is only used if it was built from
+        that exact model file. Tables saved in an older format (float16)
+        are treated as missing.
+        """
+        directory = Path(directory)
+        if not (directory / META_FILE).exists():
+            return None
+
+        meta = json.loads((directory / META_FILE).read_text())
+        if model_path is not None and meta.get("model_sha256") != file_digest(model_path):
+            return None
+
+        top_proba = np.load(directory / PROBA_FILE, mmap_mode="r")
+        if top_proba.dtype != PROBA_DTYPE:
+            return None
+
+        return cls(
+            classes=meta["classes"],
+            lower=meta["lower"],
+            upper=meta["upper"],
+            top_classes=np.load(directory / CLASSES_FILE, mmap_mode="r"),
+            top_proba=top_proba,
+            model_sha256=meta.get("model_sha256"),
+        )
+
+
+def build_table(
+    model: Any,
+    upper: Sequence[int] = DEFAULT_UPPER,
+    lower: Sequence[int] = (0, 0, 0),
+    model_sha256: str | None = None,
+) -> NPKTable:
+    """Evaluate `model.predict_proba` over every integer [N, P, K] in [lower, upper]."""
+    classes = list(model.classes_)
+    if len(classes) > 256:
+        raise ValueError(f"{len(classes)} classes do not fit in a uint8 table")
+
+    axes = [np.arange(lo, hi + 1, dtype=np.float64) for lo, hi in zip(lower, upper)]
+    shape = tuple(len(a) for a in axes)
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+    top_classes = np.empty((len(grid), TOP_K), dtype=np.uint8)
+    top_proba = np.empty((len(grid), TOP_K), dtype=PROBA_DTYPE)
+    for start in range(0, len(grid), _BUILD_CHUNK_ROWS):
+        chunk = slice(start, start + _BUILD_CHUNK_ROWS)
+        order, proba = _top_k(np.asarray(model.predict_proba(grid[chunk]), dtype=np.float64))
+        top_classes[chunk] = order
+        top_proba[chunk] = proba
+
+    return NPKTable(
+        classes=classes,
+        lower=lower,
+        upper=upper,
+        top_classes=top_classes.reshape(shape + (TOP_K,)),
+        top_proba=top_proba.reshape(shape + (TOP_K,)),
+        model_sha256=model_sha256,
+    )
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute the NPK fertilizer lookup table")
+    parser.add_argument("model", type=Path, help="pickled fertilizer model")
+    parser.add_argument("--out", type=Path, help="output directory (default: npk_table/ next to the model)")
+    parser.add_argument("--max", type=int, nargs=3, default=DEFAULT_UPPER, metavar=("N", "P", "K"))
+    args = parser.parse_args(argv)
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+
+    started = time.perf_counter()
+    table = build_table(model, upper=args.max, model_sha256=file_digest(args.model))
+    out = args.out or args.model.parent / "npk_table"
+    table.save(out)
+    stats = table.stats()
+    print(f"{stats['cells']} cells, {stats['bytes'] / 1e6:.1f} MB -> {out} "
+          f"({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
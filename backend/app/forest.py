@@ -0,0 +1,360 @@
+"""
+Array-backed inference for fitted sklearn random forests.
+
+`CompiledForest.from_sklearn` flattens every tree of a fitted
+RandomForestClassifier / RandomForestRegressor into a few contiguous NumPy
+arrays (feature, threshold, left/right child, leaf values) and evaluates all
+trees for all rows with vectorized traversal. That skips sklearn's per-call
+validation and joblib thread dispatch, which dominate for single rows.
+
+Predictions are bit-identical to sklearn's sequential (n_jobs=1) reduction:
+inputs are cast to float32 like sklearn does, leaf probabilities are
+normalized the same way, and trees are summed in estimator order.
+
+For large batches sklearn's Cython traversal spread over all cores beats
+NumPy, so when the source estimator is at hand, calls with at least
+`sklearn_min_rows` rows are handed back to it.
+
+`save` writes the arrays as .npy files and `load` memory-maps them
+read-only, so every worker process serving the same artifact shares one
+copy of the forest through the page cache instead of unpickling its own.
+A loaded forest can be given a `source_loader` that unpickles the sklearn
+estimator the first time a large batch needs it.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+# Rows x trees evaluated per traversal chunk
+_CHUNK_CELLS = 1 << 16
+
+# Arrays making up a saved forest; _children and _is_leaf are saved too so
+# loading derives nothing per process
+_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "_children", "_is_leaf")
+_META_FILE = "forest.json"
+
+
+class CompiledForest:
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        n_features: int,
+        classes: np.ndarray | None = None,
+        source: Any = None,
+        sklearn_min_rows: int = 256,
+        children: np.ndarray | None = None,
+        is_leaf: np.ndarray | None = None,
+        source_loader: Callable[[], Any] | None = None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = classes
+        self.n_estimators = len(roots)
+        self.source = source
+        self.sklearn_min_rows = int(sklearn_min_rows)
+        self._source_loader = source_loader
+        self._source_lock = threading.Lock()
+
+        # Children packed as [left, right] pairs: next = children[2 * node + go_right]
+        self._children = np.stack([left, right], axis=1).ravel() if children is None else children
+        self._is_leaf = left == np.arange(len(left)) if is_leaf is None else is_leaf
+
+    @classmethod
+    def from_sklearn(cls, forest: Any, sklearn_min_rows: int = 256) -> "CompiledForest":
+        estimators = getattr(forest, "estimators_", None)
+        if not estimators:
+            raise TypeError(f"{type(forest).__name__} is not a fitted tree ensemble")
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise TypeError("Multi-output forests are not supported")
+
+        classes = getattr(forest, "classes_", None)
+        is_classifier = classes is not None
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(offset, offset + n, dtype=np.intp)
+
+            # Leaves point at themselves so every row can take max_depth steps
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp))
+            rights.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp))
+
+            leaf_value = tree.value[:, 0, :]
+            if is_classifier:
+                # Same normalization as DecisionTreeClassifier.predict_proba
+                leaf_value = leaf_value[:, : len(classes)]
+                normalizer = leaf_value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                leaf_value = leaf_value / normalizer
+            values.append(leaf_value)
+
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, int(tree.max_depth))
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features=forest.n_features_in_,
+            classes=np.asarray(classes) if is_classifier else None,
+            source=forest,
+            sklearn_min_rows=sklearn_min_rows,
+        )
+
+    def _leaves(self, X: np.ndarray) -> np.ndarray:
+        """(rows, trees) index of the leaf each row reaches in each tree."""
+        n_rows = X.shape[0]
+        X_flat = X.ravel()
+        leaves = np.tile(self.roots, n_rows)
+        # Offset of each (row, tree) cell's row in the flattened X
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * X.shape[1], self.n_estimators)
+
+        # Walk all cells one level per step, dropping those that reached a leaf
+        active = np.flatnonzero(~self._is_leaf[leaves])
+        nodes = leaves[active]
+        while active.size:
+            go_right = X_flat[row_offsets[active] + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self._children[2 * nodes + go_right]
+            leaves[active] = nodes
+            inner = ~self._is_leaf[nodes]
+            active, nodes = active[inner], nodes[inner]
+        return leaves.reshape(n_rows, self.n_estimators)
+
+    def _accumulate(self, X: Any) -> np.ndarray:
+        # sklearn evaluates trees on float32 inputs
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}")
+
+        out = np.zeros((X.shape[0], self.value.shape[1]), dtype=np.float64)
+        # Chunk rows so the (rows, trees) working set stays cache-sized
+        step = max(1, _CHUNK_CELLS // self.n_estimators)
+        for start in range(0, X.shape[0], step):
+            leaves = self._leaves(X[start:start + step])
+            chunk = out[start:start + step]
+            # Trees are added strictly in order, matching sklearn's running sum
+            if leaves.shape[0] == 1:
+                chunk[:] = np.cumsum(self.value[leaves[0]], axis=0)[-1]
+            else:
+                for t in range(self.n_estimators):
+                    chunk += self.value[leaves[:, t]]
+        out /= self.n_estimators
+        return out
+
+    def _use_source(self, X: Any) -> bool:
+        if len(X) < self.sklearn_min_rows:
+            return False
+        if self.source is None and self._source_loader is not None:
+            with self._source_lock:
+                if self.source is None and self._source_loader is not None:
+                    try:
+                        self.source = self._source_loader()
+                    finally:
+                        # One attempt only; on failure keep traversing arrays
+                        self._source_loader = None
+        return self.source is not None
+
+    def save(self, directory: str | Path, source_sha256: str | None = None) -> None:
+        """
+        Write the forest as .npy files plus a JSON header. The directory is
+        written next to itself and renamed into place, so concurrent workers
+        never see a half-written artifact.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}.", dir=directory.parent))
+        try:
+            for name in _ARRAYS:
+                np.save(staging / f"{name.lstrip('_')}.npy", np.ascontiguousarray(getattr(self, name)))
+            meta = {
+                "max_depth": self.max_depth,
+                "n_features": self.n_features_in_,
+                "classes": self.classes_.tolist() if self.classes_ is not None else None,
+                "source_sha256": source_sha256,
+            }
+            (staging / _META_FILE).write_text(json.dumps(meta))
+            if directory.exists():
+                shutil.rmtree(directory)
+            os.replace(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(
+        cls,
+        directory: str | Path,
+        mmap: bool = True,
+        sklearn_min_rows: int = 256,
+        source_loader: Callable[[], Any] | None = None,
+        source_sha256: str | None = None,
+    ) -> "CompiledForest | None":
+        """
+        Load a saved forest, memory-mapped read-only by default. Returns None
+        if there is no artifact, or if `source_sha256` is given and the
+        artifact was built from a different model file.
+        """
+        directory = Path(directory)
+        if not (directory / _META_FILE).exists():
+            return None
+        meta = json.loads((directory / _META_FILE).read_text())
+        if source_sha256 is not None and meta.get("source_sha256") != source_sha256:
+            return None
+
+        arrays = {
+            name: np.load(directory / f"{name.lstrip('_')}.npy", mmap_mode="r" if mmap else None)
+            for name in _ARRAYS
+        }
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right=arrays["right"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=meta["max_depth"],
+            n_features=meta["n_features"],
+            classes=np.asarray(meta["classes"]) if meta["classes"] is not None else None,
+            sklearn_min_rows=sklearn_min_rows,
+            children=arrays["_children"],
+            is_leaf=arrays["_is_leaf"],
+            source_loader=source_loader,
+        )
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        if self.classes_ is None:
+            raise AttributeError("predict_proba is only available for classifiers")
+        if self._use_source(X):
+            return self.source.predict_proba(np.asarray(X))
+        return self._accumulate(X)
+
+    def predict(self, X: Any) -> np.ndarray:
+        if self._use_source(X):
+            return self.source.predict(np.asarray(X))
+        if self.classes_ is None:
+            return self._accumulate(X)[:, 0]
+        return self.classes_.take(np.argmax(self._accumulate(X), axis=1), axis=0)
+
+
+def compile_forest(model: Any, sklearn_min_rows: int = 256) -> Any:
+    """Compile a fitted sklearn forest; anything else is returned unchanged."""
+    if model is None:
+        return None
+    try:
+        return CompiledForest.from_sklearn(model, sklearn_min_rows=sklearn_min_rows)
+    except (AttributeError, TypeError, ValueError):
+        return model
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_dir(model_path: str | Path) -> Path:
+    """Where the array artifact for a pickled forest lives: model.pkl -> model.forest/"""
+    model_path = Path(model_path)
+    return model_path.with_suffix(".forest")
+
+
+def load_source(model_path: str | Path, n_jobs: int = 0) -> Any:
+    """Unpickle the sklearn estimator, overriding its trained n_jobs unless 0."""
+    import joblib
+
+    model = joblib.load(str(model_path))
+    if n_jobs and hasattr(model, "n_jobs"):
+        model.n_jobs = n_jobs
+    return model
+
+
+def load_forest_artifact(
+    model_path: str | Path,
+    sklearn_min_rows: int = 256,
+    build: bool = True,
+    n_jobs: int = 0,
+) -> Any:
+    """
+    Load the forest pickled at `model_path`, preferring its memory-mapped
+    array artifact. A missing or stale artifact is rebuilt from the pickle
+    when `build` is set (best effort; a read-only checkout just skips it).
+    The sklearn estimator itself is only unpickled when a large batch needs
+    it, or when the model is not a forest; `n_jobs` applies to it then.
+    """
+    model_path = Path(model_path)
+    digest = file_sha256(model_path)
+    loader = functools.partial(load_source, model_path, n_jobs)
+
+    forest = CompiledForest.load(
+        artifact_dir(model_path),
+        sklearn_min_rows=sklearn_min_rows,
+        source_loader=loader,
+        source_sha256=digest,
+    )
+    if forest is not None:
+        return forest
+
+    model = compile_forest(loader(), sklearn_min_rows)
+    if build and isinstance(model, CompiledForest):
+        try:
+            model.save(artifact_dir(model_path), source_sha256=digest)
+        except OSError:
+            pass
+    return model
+
+
+def main(argv: list[str] | None = None) -> None:
+    """python -m backend.app.forest model.pkl [...]: write array artifacts next to pickled forests."""
+    import joblib
+
+    for path in (argv if argv is not None else sys.argv[1:]):
+        forest = compile_forest(joblib.load(path))
+        if not isinstance(forest, CompiledForest):
+            print(f"{path}: not a random forest, skipped")
+            continue
+        forest.save(artifact_dir(path), source_sha256=file_sha256(path))
+        size = sum(getattr(forest, name).nbytes for name in _ARRAYS)
+        print(f"{path}: {forest.n_estimators} trees, {size / 1e6:.1f} MB -> {artifact_dir(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Process-wide pooled httpx client for upstream calls (Open-Meteo, etc.)."""
+
+from __future__ import annotations
+
+import importlib.util
+from collections import Counter
+from typing import Any
+
+import httpx
+
+from . import metrics, settings
+
+_client: httpx.AsyncClient | None = None
+_requests_by_host: Counter[str] = Counter()
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+async def _count_request(request: httpx.Request) -> None:
+    _requests_by_host[request.url.host] += 1
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT_S, connect=settings.HTTP_TIMEOUT_S),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+        http2=http2_available(),
+        event_hooks={
+            "request": [_count_request, metrics.on_upstream_request],
+            "response": [metrics.on_upstream_response],
+        },
+    )
+
+
+async def start() -> httpx.AsyncClient:
+    """Create the shared client; called from the app lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Shared client for all outbound requests. Falls back to creating it on
+    first use so callers outside the app lifespan (scripts, benchmarks) work.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def pool_stats() -> dict[str, Any]:
+    stats: dict[str, Any] = {
+        "started": _client is not None and not _client.is_closed,
+        "http2": http2_available(),
+        "max_connections": settings.HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "requests_by_host": dict(_requests_by_host),
+    }
+    if _client is None:
+        return stats
+
+    # httpx does not expose pool state publicly; read httpcore's pool if present
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    stats["connections"] = len(connections)
+    stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+    stats["active_connections"] = stats["connections"] - stats["idle_connections"]
+    return stats
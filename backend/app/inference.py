@@ -0,0 +1,104 @@
+"""Dedicated thread pool for model calls, with bounded admission."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class InferenceSaturated(Exception):
+    """Raised when the inference executor has no room for another call."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls (torch, sklearn) off the event loop.
+
+    At most `max_workers` calls run at once and at most `max_queue` more may
+    wait for a worker; anything beyond that is rejected immediately with
+    `InferenceSaturated` so latency stays bounded instead of queueing forever.
+    Pools serving other work pass their own subclass as `saturated`, so the
+    error can tell the caller which pool was full.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue: int = 32,
+        saturated: type[InferenceSaturated] = InferenceSaturated,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.saturated = saturated
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+
+        # Updated from worker threads when calls finish
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+
+    @property
+    def max_pending(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog drains, at least 1."""
+        avg = self._busy_seconds / self._completed if self._completed else 1.0
+        return max(1, math.ceil(self._pending / self.max_workers * avg))
+
+    async def run(self, fn: Callable[..., Any], *args: Any, admit: bool = True) -> Any:
+        """
+        Run `fn(*args)` on the pool and await its result.
+
+        `admit=False` skips the admission check for work that was already
+        admitted by another bounded queue (e.g. a soil batch forward pass).
+        """
+        if admit and self._pending >= self.max_pending:
+            self._rejected += 1
+            raise self.saturated(self.retry_after())
+
+        with self._lock:
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            future = self._pool.submit(functools.partial(fn, *args))
+        except RuntimeError:
+            # Pool already shut down
+            with self._lock:
+                self._pending -= 1
+            raise
+        # A call stays pending until its thread is done with it, even when
+        # the awaiting request has been cancelled (client disconnect)
+        future.add_done_callback(functools.partial(self._finished, started))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, started: float, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self._completed += 1
+                self._busy_seconds += time.perf_counter() - started
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_call_ms": round(self._busy_seconds / self._completed * 1000, 3) if self._completed else 0.0,
+        }
@@ -0,0 +1,102 @@
+"""Memoization for pure tabular-model predictions keyed on rounded feature vectors."""
+
+from __future__ import annotations
+
+import functools
+from typing import Any, Callable
+
+import numpy as np
+
+from .cache import TTLCache
+
+_registry: dict[str, "Memoized"] = {}
+
+
+def _round(value: Any, precision: int) -> Any:
+    """Round numeric inputs to `precision` decimals; leave anything else alone."""
+    if isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.floating):
+        return np.round(value, precision)
+    if isinstance(value, float):
+        return round(value, precision)
+    return value
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of an (already rounded) argument."""
+    if isinstance(value, np.ndarray):
+        return (value.shape, tuple(value.ravel().tolist()))
+    return value
+
+
+class Memoized:
+    """
+    Wraps a pure function of small numeric inputs with a bounded LRU cache.
+
+    Float arguments (and float arrays) are rounded to `precision` decimals;
+    the rounded values form the cache key and are also what the function is
+    called with, so a cached result is exactly what a fresh call would return.
+    Cached results are shared between callers and must not be mutated.
+    While `cache_when()` returns False (e.g. models still loading and the
+    function answering from a fallback) results are computed but not stored.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        name: str,
+        precision: int,
+        maxsize: int,
+        extra_key: Callable[[], Any] | None = None,
+        cache_when: Callable[[], bool] | None = None,
+    ):
+        self.fn = fn
+        self.name = name
+        self.precision = precision
+        self.enabled = maxsize > 0
+        self.cache = TTLCache(maxsize=max(1, maxsize))
+        self.extra_key = extra_key
+        self.cache_when = cache_when
+        functools.update_wrapper(self, fn)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        if not self.enabled:
+            return self.fn(*args, **kwargs)
+
+        args = tuple(_round(a, self.precision) for a in args)
+        kwargs = {k: _round(v, self.precision) for k, v in kwargs.items()}
+        key = (
+            tuple(_freeze(a) for a in args),
+            tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())),
+            self.extra_key() if self.extra_key is not None else None,
+        )
+
+        result = self.cache.get(key)
+        if result is None:
+            result = self.fn(*args, **kwargs)
+            if self.cache_when is None or self.cache_when():
+                self.cache.set(key, result)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        return {"enabled": self.enabled, "precision": self.precision, **self.cache.stats()}
+
+
+def memoize(
+    name: str,
+    precision: int = 2,
+    maxsize: int = 4096,
+    extra_key: Callable[[], Any] | None = None,
+    cache_when: Callable[[], bool] | None = None,
+) -> Callable[[Callable[..., Any]], Memoized]:
+    """Decorator registering a `Memoized` wrapper under `name` (maxsize 0 disables it)."""
+
+    def decorate(fn: Callable[..., Any]) -> Memoized:
+        memoized = Memoized(fn, name, precision, maxsize, extra_key, cache_when)
+        _registry[name] = memoized
+        return memoized
+
+    return decorate
+
+
+def memo_stats() -> dict[str, Any]:
+    return {name: m.stats() for name, m in _registry.items()}
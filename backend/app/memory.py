@@ -0,0 +1,42 @@
+"""Per-process memory accounting from /proc (Linux only)."""
+
+from __future__ import annotations
+
+from typing import Any
+
+
+def smaps_rollup(pid: int | str = "self") -> dict[str, int] | None:
+    """Fields of /proc/<pid>/smaps_rollup in kB, or None where it is unavailable."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    fields = {}
+    for line in lines[1:]:
+        key, _, rest = line.partition(":")
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            fields[key] = int(parts[0])
+    return fields
+
+
+def memory_stats(pid: int | str = "self") -> dict[str, Any] | None:
+    """
+    RSS, PSS and USS in MB. USS (unique set size: private clean + dirty
+    pages) is what the process costs on its own; pages shared with other
+    workers, such as memory-mapped model weights or copy-on-write pages
+    inherited from a preloading parent, only show up in RSS/PSS.
+    """
+    fields = smaps_rollup(pid)
+    if fields is None:
+        return None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+    }
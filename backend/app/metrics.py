@@ -0,0 +1,261 @@
+"""
+Request, stage, upstream and model metrics in Prometheus text format (GET /metrics).
+
+Hot paths only touch the counters and histograms defined here: an
+observation is a bisect and a few additions under a lock, about a
+microsecond. Numbers other components already keep (cache hit/miss counts,
+executor queues, micro-batch sizes) are read from their `stats()` by
+collectors at scrape time and cost nothing per request. Call counts are the
+`_count` series of the duration histograms.
+
+Metrics are per process; with the preload server each worker reports its
+own, so scrape every worker or aggregate by `instance`.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+import httpx
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cache hits (sub-ms) up to slow upstream calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+# (name, type, help, [(labels, value)]) as returned by collectors
+Family = tuple[str, str, str, list[tuple[dict[str, Any], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items)
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series: dict[tuple[Any, ...], list[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(counts), total)) for k, (counts, total) in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_family(family: Family) -> list[str]:
+    name, kind, help, samples = family
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request, until the last body chunk is sent.",
+    ("method", "route", "status"),
+)
+stage_seconds = Histogram(
+    "stage_duration_seconds",
+    "Wall time of one pipeline stage of an endpoint.",
+    ("endpoint", "stage"),
+)
+upstream_seconds = Histogram(
+    "upstream_request_duration_seconds",
+    "Time from sending an upstream request to its response headers.",
+    ("host", "status"),
+)
+upstream_errors = Counter(
+    "upstream_request_errors_total",
+    "Upstream requests that failed without a response (timeouts, connection errors).",
+    ("host", "error"),
+)
+model_call_seconds = Histogram(
+    "model_call_duration_seconds",
+    "Time of one model forward pass (soil, crop, fertilizer, yield).",
+    ("model",),
+)
+model_batch_rows = Histogram(
+    "model_batch_rows",
+    "Rows per model forward pass.",
+    ("model",),
+    buckets=ROW_BUCKETS,
+)
+
+_instruments: list[Counter | Histogram] = [
+    http_request_seconds,
+    stage_seconds,
+    upstream_seconds,
+    upstream_errors,
+    model_call_seconds,
+    model_batch_rows,
+]
+_collectors: list[Callable[[], Iterable[Family]]] = []
+
+
+def register_collector(collect: Callable[[], Iterable[Family]]) -> None:
+    """Add a function returning metric families built at scrape time."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines: list[str] = []
+    for instrument in _instruments:
+        lines.extend(instrument.render())
+    for collect in _collectors:
+        for family in collect():
+            lines.extend(render_family(family))
+    return "\n".join(lines) + "\n"
+
+
+def observe_stages(endpoint: str, timings: dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        stage_seconds.observe(seconds, endpoint, stage)
+
+
+def observe_model_call(model: str, rows: int, seconds: float) -> None:
+    model_call_seconds.observe(seconds, model)
+    model_batch_rows.observe(rows, model)
+
+
+@contextmanager
+def model_call(model: str, rows: int = 1) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_model_call(model, rows, time.perf_counter() - started)
+
+
+def cache_families(caches: dict[str, dict[str, Any] | None]) -> list[Family]:
+    """Hit/miss/eviction counters and sizes from `TTLCache.stats()`-shaped dicts."""
+    present = {name: stats for name, stats in caches.items() if stats is not None}
+
+    def samples(key: str) -> list[tuple[dict[str, Any], float]]:
+        return [({"cache": name}, stats.get(key, 0)) for name, stats in present.items()]
+
+    return [
+        ("cache_hits_total", "counter", "Cache lookups that found an entry.", samples("hits")),
+        ("cache_misses_total", "counter", "Cache lookups that found nothing.", samples("misses")),
+        ("cache_evictions_total", "counter", "Entries evicted to stay within maxsize.", samples("evictions")),
+        ("cache_entries", "gauge", "Entries currently cached.", samples("size")),
+        ("cache_hit_ratio", "gauge", "hits / (hits + misses) since start.", samples("hit_ratio")),
+    ]
+
+
+# Upstream (httpx) event hooks; the request hook stamps the send time
+
+async def on_upstream_request(request: httpx.Request) -> None:
+    request.extensions["metrics_started"] = time.perf_counter()
+
+
+async def on_upstream_response(response: httpx.Response) -> None:
+    started = response.request.extensions.get("metrics_started")
+    if started is not None:
+        upstream_seconds.observe(time.perf_counter() - started, response.request.url.host, response.status_code)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request by route template (not raw path, which would
+    make one series per id) and response status. Requests that match no
+    route are reported as route "unmatched".
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, scope["method"], route, status)
@@ -0,0 +1,161 @@
+"""
+Model registry: load and warm every model off the request path.
+
+Each model is registered with a loader (and optionally a warm-up that runs
+one dummy inference). `ModelRegistry.load_all` runs them one after another
+on a worker thread, so the server accepts connections immediately and
+`/health/live` answers while torch and sklearn are still importing.
+Handlers ask the registry for models with `require()`, which raises
+`ModelNotReady` until that model has loaded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelNotReady(Exception):
+    """A handler needed a model that is still loading."""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"Model '{name}' is still loading")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class ModelLoadFailed(Exception):
+    """A handler needed a model that failed to load."""
+
+    def __init__(self, name: str, error: str | None):
+        super().__init__(f"{name.capitalize()} model failed to load: {error}")
+        self.name = name
+        self.error = error
+
+
+@dataclass
+class ModelSlot:
+    name: str
+    loader: Callable[[], Any]
+    warmup: Callable[[Any], Any] | None = None
+    # Readiness waits for required models only; optional ones have fallbacks
+    required: bool = True
+    state: str = PENDING
+    value: Any = None
+    error: str | None = None
+    load_seconds: float | None = None
+    warmup_seconds: float | None = None
+
+    def load(self) -> None:
+        self.state = LOADING
+        started = time.perf_counter()
+        try:
+            value = self.loader()
+            self.load_seconds = time.perf_counter() - started
+            if self.warmup is not None and value is not None:
+                started = time.perf_counter()
+                self.warmup(value)
+                self.warmup_seconds = time.perf_counter() - started
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self.state = FAILED
+            traceback.print_exc()
+        else:
+            self.value = value
+            self.state = READY
+        finally:
+            if self.load_seconds is None:
+                self.load_seconds = time.perf_counter() - started
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    def __init__(self) -> None:
+        self._slots: dict[str, ModelSlot] = {}
+        self._task: asyncio.Task | None = None
+        self._started_at = time.perf_counter()
+        self._finished_at: float | None = None
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Callable[[Any], Any] | None = None,
+        required: bool = True,
+    ) -> None:
+        """Register a model; models load in registration order."""
+        self._slots[name] = ModelSlot(name, loader, warmup, required)
+
+    def load_all(self) -> None:
+        """Load and warm every pending model on the calling thread."""
+        for slot in self._slots.values():
+            if slot.state == PENDING:
+                slot.load()
+        self._finished_at = time.perf_counter()
+
+    def start(self) -> asyncio.Task:
+        """Run `load_all` on a worker thread in the background (idempotent)."""
+        if self._task is None:
+            self._started_at = time.perf_counter()
+            self._task = asyncio.create_task(asyncio.to_thread(self.load_all), name="model-loader")
+        return self._task
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await self._task
+
+    def get(self, name: str) -> Any:
+        """The loaded model, or None while it is loading or if it failed."""
+        slot = self._slots[name]
+        return slot.value if slot.state == READY else None
+
+    def require(self, name: str) -> Any:
+        slot = self._slots[name]
+        if slot.state == READY:
+            return slot.value
+        if slot.state == FAILED:
+            raise ModelLoadFailed(name, slot.error)
+        raise ModelNotReady(name)
+
+    def state(self, name: str) -> str:
+        return self._slots[name].state
+
+    def error(self, name: str) -> str | None:
+        return self._slots[name].error
+
+    @property
+    def settled(self) -> bool:
+        """Every model has finished loading, successfully or not."""
+        return all(slot.state in (READY, FAILED) for slot in self._slots.values())
+
+    @property
+    def ready(self) -> bool:
+        """Loading is done and every required model loaded."""
+        return self.settled and all(
+            slot.state == READY for slot in self._slots.values() if slot.required
+        )
+
+    def stats(self) -> dict[str, Any]:
+        finished = self._finished_at if self._finished_at is not None else time.perf_counter()
+        return {
+            "ready": self.ready,
+            "settled": self.settled,
+            "elapsed_seconds": round(finished - self._started_at, 3),
+            "models": {name: slot.stats() for name, slot in self._slots.items()},
+        }
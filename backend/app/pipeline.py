@@ -0,0 +1,66 @@
+"""Run request stages as a small dependency graph so independent work overlaps."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a request pipeline. `fn` is awaited with the results of its
+    `deps` passed as keyword arguments named after those stages.
+    """
+
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    deps: tuple[str, ...] = ()
+
+
+async def run_stages(
+    stages: list[Stage],
+    timings: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """
+    Start every stage as soon as its dependencies finish and return
+    {stage name: result}. Stages may only depend on stages listed before
+    them, which rules out cycles. If any stage fails the rest are cancelled
+    and the first error is raised. Per-stage wall time in seconds is written
+    into `timings` when given.
+    """
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run(stage: Stage) -> Any:
+        inputs = {dep: await tasks[dep] for dep in stage.deps}
+        started = time.perf_counter()
+        try:
+            return await stage.fn(**inputs)
+        finally:
+            if timings is not None:
+                timings[stage.name] = time.perf_counter() - started
+
+    seen: set[str] = set()
+    for stage in stages:
+        if stage.name in seen:
+            raise ValueError(f"Duplicate stage '{stage.name}'")
+        missing = [dep for dep in stage.deps if dep not in seen]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown or later stages: {missing}")
+        seen.add(stage.name)
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run(stage), name=f"stage:{stage.name}")
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        # Let cancelled stages unwind before the error propagates
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return {name: task.result() for name, task in tasks.items()}
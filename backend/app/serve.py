@@ -0,0 +1,141 @@
+"""
+Preload-then-fork server.
+
+    python -m backend.app.serve --workers 4 --host 0.0.0.0 --port 8000
+
+`uvicorn --workers N` spawns fresh interpreters, so every worker imports
+torch and loads every model on its own. Here the parent process loads and
+warms all models once, freezes the garbage collector, binds the listening
+socket and then forks the workers. The workers inherit the loaded models
+as copy-on-write pages, so their unique memory (USS, see /health "memory")
+is only what they allocate after the fork. Workers that exit unexpectedly
+are re-forked from the same preloaded parent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from . import main as app_main, settings
+from .memory import memory_stats
+
+
+def _log(message: str) -> None:
+    print(f"[serve {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def _preload() -> int | None:
+    """Load and warm every model in the parent; returns torch's thread count to restore."""
+    torch_threads = None
+    try:
+        import torch
+    except ImportError:
+        torch = None
+    if torch is not None:
+        # Keep the parent's intra-op pool single-threaded: a thread pool
+        # started before fork() is not usable in the children, which get
+        # TORCH_THREADS (or torch's default) back after forking
+        torch_threads = settings.TORCH_THREADS or torch.get_num_threads()
+        settings.TORCH_THREADS = 1
+        torch.set_num_threads(1)
+
+    started = time.perf_counter()
+    app_main.models.load_all()
+    _log(f"models preloaded in {time.perf_counter() - started:.2f}s: {app_main.models.stats()['models']}")
+    return torch_threads
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, args: argparse.Namespace, torch_threads: int | None) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if torch_threads is not None:
+        import torch
+
+        settings.TORCH_THREADS = torch_threads
+        torch.set_num_threads(torch_threads)
+
+    config = uvicorn.Config(app_main.app, log_level=args.log_level, timeout_keep_alive=args.timeout_keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS or os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    torch_threads = _preload()
+    # Objects that exist now are never collected; keeping the collector off
+    # them stops it from touching (and un-sharing) their pages in every worker
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(args.host, args.port)
+    _log(f"listening on {args.host}:{args.port}, parent {memory_stats()}")
+
+    workers: set[int] = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, args, torch_threads)
+            finally:
+                os._exit(0)
+        workers.add(pid)
+        _log(f"started worker {pid}")
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            _log(f"worker {pid} exited with status {status}, restarting")
+            time.sleep(1.0)
+            spawn()
+
+    sock.close()
+    _log("stopped")
+
+
+if __name__ == "__main__":
+    main()
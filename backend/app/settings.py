@@ -0,0 +1,165 @@
+"""
+Runtime tuning knobs for the backend, read once from the environment.
+
+Numeric knobs fall back to the "settings" of the runtime config file
+(backend/runtime_config.json, or RUNTIME_CONFIG) before their defaults, so
+machine-specific values written by `python -m backend.benchmarks.topology`
+apply without exporting anything. Environment variables always win.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+RUNTIME_CONFIG_PATH = Path(
+    os.getenv("RUNTIME_CONFIG") or Path(__file__).resolve().parents[1] / "runtime_config.json"
+)
+
+
+def load_runtime_config(path: Path) -> dict[str, Any]:
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring runtime config {path}: {e}")
+        return {}
+    values = data.get("settings") if isinstance(data, dict) else None
+    return values if isinstance(values, dict) else {}
+
+
+RUNTIME_CONFIG = load_runtime_config(RUNTIME_CONFIG_PATH)
+
+
+def _raw(name: str) -> Any:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return RUNTIME_CONFIG.get(name)
+    return value
+
+
+def env_int(name: str, default: int) -> int:
+    value = _raw(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    value = _raw(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# Soil classifier micro-batching
+SOIL_BATCH_MAX_SIZE = max(1, env_int("SOIL_BATCH_MAX_SIZE", 8))
+SOIL_BATCH_MAX_WAIT_MS = max(0.0, env_float("SOIL_BATCH_MAX_WAIT_MS", 5.0))
+SOIL_BATCH_MAX_QUEUE = max(1, env_int("SOIL_BATCH_MAX_QUEUE", 64))
+
+# Inference executor: model calls run on this many threads, with at most
+# INFERENCE_MAX_QUEUE more waiting before requests get 503 + Retry-After
+INFERENCE_WORKERS = max(1, env_int("INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+INFERENCE_MAX_QUEUE = max(0, env_int("INFERENCE_MAX_QUEUE", 32))
+
+# Open-Meteo endpoints (pointed at a local stub by the topology benchmark)
+WEATHER_FORECAST_URL = os.getenv("WEATHER_FORECAST_URL") or "https://api.open-meteo.com/v1/forecast"
+WEATHER_ARCHIVE_URL = os.getenv("WEATHER_ARCHIVE_URL") or "https://archive-api.open-meteo.com/v1/archive"
+
+# Weather cache: farms within the same grid cell share Open-Meteo results
+WEATHER_GRID_DEG = max(0.0, env_float("WEATHER_GRID_DEG", 0.01))
+WEATHER_CURRENT_TTL_S = max(0.0, env_float("WEATHER_CURRENT_TTL_S", 600.0))
+WEATHER_CACHE_MAX_ENTRIES = max(1, env_int("WEATHER_CACHE_MAX_ENTRIES", 4096))
+
+# Shared upstream HTTP client pool
+HTTP_TIMEOUT_S = max(0.1, env_float("HTTP_TIMEOUT_S", 10.0))
+HTTP_MAX_CONNECTIONS = max(1, env_int("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = max(0, env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY_S = max(0.0, env_float("HTTP_KEEPALIVE_EXPIRY_S", 30.0))
+
+# Soil photo uploads: largest accepted file, and most pixels an image may
+# decode to (JPEGs are counted after the reduced-size draft decode)
+UPLOAD_MAX_BYTES = max(1024, env_int("UPLOAD_MAX_BYTES", 16 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = max(1, env_int("UPLOAD_MAX_PIXELS", 16_000_000))
+
+# Soil results by photo content; 0 entries disables. SOIL_CACHE_PERCEPTUAL
+# also matches re-encoded copies of a photo by their dHash
+SOIL_CACHE_MAX_ENTRIES = max(0, env_int("SOIL_CACHE_MAX_ENTRIES", 4096))
+SOIL_CACHE_PERCEPTUAL = env_int("SOIL_CACHE_PERCEPTUAL", 0) != 0
+
+# Batch /predict endpoint
+BATCH_MAX_ROWS = max(1, env_int("BATCH_MAX_ROWS", 5000))
+# Whole JSON/CSV body, base64 photos included
+BATCH_MAX_BYTES = max(1024, env_int("BATCH_MAX_BYTES", 64 * 1024 * 1024))
+BATCH_WEATHER_CONCURRENCY = max(1, env_int("BATCH_WEATHER_CONCURRENCY", 8))
+BATCH_STREAM_CHUNK_ROWS = max(1, env_int("BATCH_STREAM_CHUNK_ROWS", 256))
+
+# Compiled forests hand batches of at least this many rows back to sklearn
+FOREST_SKLEARN_MIN_ROWS = max(1, env_int("FOREST_SKLEARN_MIN_ROWS", 256))
+
+# Longest yield forecast horizon a request may ask for
+YIELD_MAX_DAYS = max(1, env_int("YIELD_MAX_DAYS", 365))
+
+# Memoized tabular predictions (crop, fertilizer, yield); 0 entries disables
+MEMO_PRECISION = max(0, env_int("MEMO_PRECISION", 2))
+MEMO_MAX_ENTRIES = max(0, env_int("MEMO_MAX_ENTRIES", 4096))
+
+# Model artifacts: memory-map forest arrays and soil weights so worker
+# processes share them through the page cache (0 loads private copies)
+MODEL_MMAP = env_int("MODEL_MMAP", 1) != 0
+
+# Build the integer NPK fertilizer lookup table from the loaded model when
+# it is missing or was built from another model file (0 only loads it)
+NPK_TABLE_AUTOBUILD = env_int("NPK_TABLE_AUTOBUILD", 1) != 0
+
+# Soil classifier CPU inference mode: none, jit, dynamic or static (int8).
+# Static quantization calibrates on the photos in SOIL_CALIBRATION_DIR the
+# first time its artifact is built.
+SOIL_MODEL_OPTIMIZE = (os.getenv("SOIL_MODEL_OPTIMIZE") or "none").strip().lower()
+SOIL_CALIBRATION_DIR = (os.getenv("SOIL_CALIBRATION_DIR") or "").strip()
+
+# Chat assistant: CHAT_BACKEND is "gemini" or "stub" (offline canned
+# replies). Calls run on their own pool of CHAT_MAX_CONCURRENCY threads;
+# models reporting not-found are skipped for CHAT_UNAVAILABLE_TTL_S.
+# CHAT_MODELS (comma-separated) overrides the model fallback order.
+CHAT_BACKEND = (os.getenv("CHAT_BACKEND") or "gemini").strip().lower()
+CHAT_MODELS = tuple(m.strip() for m in (os.getenv("CHAT_MODELS") or "").split(",") if m.strip())
+CHAT_MAX_CONCURRENCY = max(1, env_int("CHAT_MAX_CONCURRENCY", 8))
+CHAT_MAX_QUEUE = max(0, env_int("CHAT_MAX_QUEUE", 32))
+CHAT_UNAVAILABLE_TTL_S = max(0.0, env_float("CHAT_UNAVAILABLE_TTL_S", 600.0))
+CHAT_STUB_DELAY_MS = max(0.0, env_float("CHAT_STUB_DELAY_MS", 0.0))
+CHAT_STUB_UNAVAILABLE = tuple(
+    m.strip() for m in (os.getenv("CHAT_STUB_UNAVAILABLE") or "").split(",") if m.strip()
+)
+
+# First-turn chat replies cached by normalized question; 0 entries disables
+CHAT_FAQ_CACHE_MAX_ENTRIES = max(0, env_int("CHAT_FAQ_CACHE_MAX_ENTRIES", 1024))
+CHAT_FAQ_CACHE_TTL_S = max(0.0, env_float("CHAT_FAQ_CACHE_TTL_S", 86400.0))
+
+# Server-side chat sessions: evicted after CHAT_SESSION_IDLE_S without a
+# turn; kept as JSON files under CHAT_SESSION_DIR when set (else in memory,
+# at most CHAT_SESSION_MAX). History sent upstream is trimmed to about
+# CHAT_HISTORY_TOKEN_BUDGET tokens, older questions kept as a summary.
+CHAT_SESSION_IDLE_S = max(1.0, env_float("CHAT_SESSION_IDLE_S", 1800.0))
+CHAT_SESSION_MAX = max(1, env_int("CHAT_SESSION_MAX", 10000))
+CHAT_SESSION_DIR = (os.getenv("CHAT_SESSION_DIR") or "").strip()
+CHAT_HISTORY_TOKEN_BUDGET = max(1, env_int("CHAT_HISTORY_TOKEN_BUDGET", 1500))
+
+# Process/thread topology; `python -m backend.benchmarks.topology` measures
+# these together and writes the best combination to the runtime config.
+# SERVE_WORKERS: processes forked by backend.app.serve (0 = one per CPU)
+# TORCH_THREADS: torch intra-op threads per worker (0 = torch's default)
+# FOREST_N_JOBS: joblib jobs for sklearn forest calls (0 = as trained)
+SERVE_WORKERS = max(0, env_int("SERVE_WORKERS", 0))
+TORCH_THREADS = max(0, env_int("TORCH_THREADS", 0))
+FOREST_N_JOBS = env_int("FOREST_N_JOBS", 0)
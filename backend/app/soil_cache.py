@@ -0,0 +1,79 @@
+"""
+Soil classification results cached by image content.
+
+Farmers re-submit the same photo while adjusting NPK or pH, so /predict
+looks the upload up by a hash of its bytes before decoding anything; a hit
+skips decode and inference entirely. With `perceptual` set, a miss is also
+looked up by a difference hash (dHash) of the decoded pixels, which
+survives re-encoding and resizing, so a re-saved copy skips inference. Only
+identical dHashes match: similar-looking but different photos of
+neighbouring fields stay apart.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import numpy as np
+
+from .cache import TTLCache
+
+# dHash grid: compares 9 columns pairwise over 8 rows -> 64 bits
+_DHASH_SIZE = (9, 8)
+
+
+def content_key(data: bytes) -> bytes:
+    """128-bit BLAKE2b digest of the uploaded bytes (hashlib releases the GIL for large inputs)."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def dhash(pixels: np.ndarray) -> int:
+    """64-bit difference hash of (H, W, 3) uint8 pixels."""
+    from PIL import Image
+
+    gray = Image.fromarray(pixels).convert("L").resize(_DHASH_SIZE, Image.BOX)
+    grid = np.asarray(gray, dtype=np.int16)
+    bits = (grid[:, 1:] > grid[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class SoilResultCache:
+    """
+    Bounded LRU of (soil type, confidence %) by content key and, optionally,
+    by dHash. Entries never expire: a process serves one soil model.
+    """
+
+    def __init__(self, maxsize: int = 4096, perceptual: bool = False):
+        self.perceptual = perceptual
+        self._exact = TTLCache(maxsize=maxsize)
+        self._similar = TTLCache(maxsize=maxsize) if perceptual else None
+        self.perceptual_hits = 0
+
+    def get(self, key: bytes) -> tuple[str, float] | None:
+        return self._exact.get(key)
+
+    def get_similar(self, key: bytes, pixels: np.ndarray) -> tuple[tuple[str, float] | None, int | None]:
+        """(cached result or None, dHash) for decoded pixels; a hit is also remembered under `key`."""
+        if self._similar is None:
+            return None, None
+        phash = dhash(pixels)
+        result = self._similar.get(phash)
+        if result is not None:
+            self.perceptual_hits += 1
+            self._exact.set(key, result)
+        return result, phash
+
+    def put(self, key: bytes, result: tuple[str, float], phash: int | None = None) -> None:
+        self._exact.set(key, result)
+        if self._similar is not None and phash is not None:
+            self._similar.set(phash, result)
+
+    def stats(self) -> dict[str, Any]:
+        exact = self._exact.stats()
+        return {
+            **exact,
+            "perceptual": self.perceptual,
+            "perceptual_hits": self.perceptual_hits,
+            "perceptual_size": len(self._similar) if self._similar is not None else 0,
+        }
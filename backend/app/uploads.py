@@ -0,0 +1,150 @@
+"""
+Bounded ingestion of uploaded soil photos.
+
+Three checks keep per-request memory predictable, each as early as the
+data allows:
+
+    bytes   `UploadLimitMiddleware` rejects a request body over its path's
+            limit from Content-Length before reading it, and stops reading
+            a streamed (chunked) body as soon as it passes the limit
+    format  `read_upload` reads the file in chunks and checks the magic
+            bytes of the first one; only JPEG, PNG and WebP get decoded
+    pixels  the decoder is given `max_pixels` and checks the header's
+            dimensions before decoding (preprocess.open_image)
+
+Rejections are 413 (too large) or 415 (not a supported image).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi import HTTPException, Request, UploadFile
+
+READ_CHUNK_BYTES = 64 * 1024
+
+# Room for the multipart boundaries and the small form fields sent along
+# with the file on top of the file size limit
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+SUPPORTED_FORMATS = "JPEG, PNG or WebP"
+
+
+def sniff_image_format(head: bytes) -> str | None:
+    """Image format from the first bytes of the file, or None if it is not one we decode."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def _too_large(max_bytes: int, what: str = "Image") -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{what} too large; the limit is {max_bytes / (1024 * 1024):.0f} MB")
+
+
+def check_image_bytes(data: bytes, max_bytes: int) -> None:
+    """Byte and format checks for an image that is already in memory (batch rows)."""
+    if len(data) > max_bytes:
+        raise _too_large(max_bytes)
+    if sniff_image_format(data[:16]) is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported image format; upload a {SUPPORTED_FORMATS} photo")
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """
+    Read an uploaded image in chunks, at most `max_bytes` of it. The format
+    is sniffed from the first chunk, so anything else is refused before the
+    rest is read.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    head = await file.read(READ_CHUNK_BYTES)
+    if not head:
+        raise HTTPException(status_code=400, detail="Empty image file")
+    if sniff_image_format(head) is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported image format; upload a {SUPPORTED_FORMATS} photo")
+
+    chunks = [head]
+    total = len(head)
+    while chunk := await file.read(READ_CHUNK_BYTES):
+        total += len(chunk)
+        if total > max_bytes:
+            raise _too_large(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """Read a request body as it streams in, with a 413 once it passes `max_bytes`."""
+    chunks = []
+    total = 0
+    async for chunk in request.stream():
+        total += len(chunk)
+        if total > max_bytes:
+            raise _too_large(max_bytes, "Request body")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+class UploadLimitMiddleware:
+    """
+    Caps request bodies per path. `limits` maps a path to its byte limit.
+
+    Bodies are refused from Content-Length before they are read. Without
+    one, the body is counted as it streams in and reading stops with a 413
+    once it passes the limit, so the multipart parser never spools more
+    than that to memory or disk.
+    """
+
+    def __init__(self, app: Any, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        limit = self.limits.get(scope.get("path", "")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            length = int(headers.get(b"content-length", b""))
+        except ValueError:
+            length = None
+        if length is not None and length > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive() -> dict[str, Any]:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing; FastAPI passes HTTPException through
+                    raise _too_large(limit, "Request body")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def _reject(send: Any, limit: int) -> None:
+        body = json.dumps({"detail": _too_large(limit, "Request body").detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            # The body was not read; don't let the client reuse the connection
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
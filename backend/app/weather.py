@@ -0,0 +1,204 @@
+"""Open-Meteo current conditions and 30-day rainfall, cached per grid cell."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import httpx
+from fastapi import HTTPException
+
+from . import http_client, metrics, settings
+from .cache import TTLCache
+from .singleflight import SingleFlight
+
+# Current conditions change within minutes; the precipitation archive only
+# gains a new day at UTC midnight, so its entries expire then.
+current_cache = TTLCache(maxsize=settings.WEATHER_CACHE_MAX_ENTRIES, ttl=settings.WEATHER_CURRENT_TTL_S)
+rainfall_cache = TTLCache(maxsize=settings.WEATHER_CACHE_MAX_ENTRIES)
+
+# Concurrent misses for the same grid cell share one upstream request
+current_flight = SingleFlight()
+rainfall_flight = SingleFlight()
+
+
+def _open_meteo_weathercode_to_openweather_icon(weather_code: int) -> tuple[str, str]:
+    """
+    Returns (description, openweather_icon_code) so the frontend can reuse existing UI.
+    Icon codes: https://openweathermap.org/weather-conditions (e.g. 01d, 03d, 10d, 11d, 13d, 50d)
+    """
+    if weather_code == 0:
+        return ("Clear sky", "01d")
+    if weather_code in (1, 2):
+        return ("Partly cloudy", "02d")
+    if weather_code == 3:
+        return ("Overcast", "04d")
+    if weather_code in (45, 48):
+        return ("Fog", "50d")
+    if 51 <= weather_code <= 57:
+        return ("Drizzle", "09d")
+    if 61 <= weather_code <= 67:
+        return ("Rain", "10d")
+    if 71 <= weather_code <= 77:
+        return ("Snow", "13d")
+    if weather_code in (80, 81, 82):
+        return ("Rain showers", "09d")
+    if weather_code in (85, 86):
+        return ("Snow showers", "13d")
+    if weather_code in (95, 96, 99):
+        return ("Thunderstorm", "11d")
+    return ("Weather", "03d")
+
+
+def grid_cell(lat: float, lon: float, grid_deg: float | None = None) -> tuple[float, float]:
+    """Snap coordinates to the centre of their cache grid cell (0 disables snapping)."""
+    grid = settings.WEATHER_GRID_DEG if grid_deg is None else grid_deg
+    if grid <= 0:
+        return (lat, lon)
+    return (round(round(lat / grid) * grid, 6), round(round(lon / grid) * grid, 6))
+
+
+def _next_utc_midnight(now: datetime) -> datetime:
+    return datetime(now.year, now.month, now.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+
+async def _get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    try:
+        return await client.get(url)
+    except httpx.RequestError as e:
+        metrics.upstream_errors.inc(httpx.URL(url).host, type(e).__name__)
+        raise
+
+
+async def _fetch_current(client: httpx.AsyncClient, lat: float, lon: float) -> dict[str, Any]:
+    # Current weather (no API key)
+    forecast_url = (
+        f"{settings.WEATHER_FORECAST_URL}"
+        f"?latitude={lat}&longitude={lon}"
+        "&current=temperature_2m,relative_humidity_2m,cloud_cover,wind_speed_10m,weather_code"
+        "&timezone=auto"
+    )
+    forecast_res = await _get(client, forecast_url)
+
+    if forecast_res.status_code != 200:
+        raise HTTPException(status_code=502, detail="Failed to fetch weather data")
+
+    forecast_json = forecast_res.json()
+    current = forecast_json.get("current") or {}
+    weather_code = int(current.get("weather_code", 0))
+    description, icon = _open_meteo_weathercode_to_openweather_icon(weather_code)
+
+    return {
+        "temperature_c": float(current.get("temperature_2m", 0.0)),
+        "humidity_pct": float(current.get("relative_humidity_2m", 0.0)),
+        "wind_speed_ms": float(current.get("wind_speed_10m", 0.0)),
+        "cloud_cover_pct": float(current.get("cloud_cover", 0.0)),
+        "weather_code": weather_code,
+        "weather_description": description,
+        "weather_icon": icon,
+    }
+
+
+async def _fetch_rainfall(
+    client: httpx.AsyncClient, lat: float, lon: float, end: datetime
+) -> dict[str, float] | None:
+    # Last 30 days daily precipitation (archive API, no key)
+    start = end - timedelta(days=29)
+    archive_url = (
+        f"{settings.WEATHER_ARCHIVE_URL}"
+        f"?latitude={lat}&longitude={lon}"
+        f"&start_date={start.date().isoformat()}&end_date={end.date().isoformat()}"
+        "&daily=precipitation_sum&timezone=auto"
+    )
+    archive_res = await _get(client, archive_url)
+
+    if archive_res.status_code != 200:
+        return None
+
+    rainfall_last_30d = 0.0
+    rainfall_daily_avg = 0.0
+    archive_json = archive_res.json()
+    daily = archive_json.get("daily") or {}
+    precipitation = daily.get("precipitation_sum") or []
+    if isinstance(precipitation, list) and precipitation:
+        vals = [float(x or 0.0) for x in precipitation]
+        rainfall_last_30d = float(sum(vals))
+        rainfall_daily_avg = float(rainfall_last_30d / len(vals))
+
+    return {
+        "rainfall_last_30d_mm": rainfall_last_30d,
+        "rainfall_daily_avg_mm": rainfall_daily_avg,
+    }
+
+
+async def _cached_current(lat: float, lon: float) -> dict[str, Any]:
+    key = (lat, lon)
+    current = current_cache.get(key)
+    if current is not None:
+        return current
+
+    async def load() -> dict[str, Any]:
+        value = await _fetch_current(http_client.get_client(), lat, lon)
+        current_cache.set(key, value)
+        return value
+
+    return await current_flight.do(key, load)
+
+
+async def _cached_rainfall(lat: float, lon: float, now: datetime) -> dict[str, float]:
+    yesterday = now - timedelta(days=1)
+    key = (lat, lon, yesterday.date())
+    rainfall = rainfall_cache.get(key)
+    if rainfall is not None:
+        return rainfall
+
+    async def load() -> dict[str, float]:
+        value = await _fetch_rainfall(http_client.get_client(), lat, lon, yesterday)
+        if value is None:
+            # Archive outage: report no rainfall but don't cache the gap
+            return {"rainfall_last_30d_mm": 0.0, "rainfall_daily_avg_mm": 0.0}
+        rainfall_cache.set(key, value, expires_at=_next_utc_midnight(now).timestamp())
+        return value
+
+    return await rainfall_flight.do(key, load)
+
+
+async def fetch_weather_and_rainfall(lat: float, lon: float) -> dict[str, Any]:
+    lat, lon = grid_cell(lat, lon)
+    current, rainfall = await asyncio.gather(
+        _cached_current(lat, lon),
+        _cached_rainfall(lat, lon, datetime.now(timezone.utc)),
+    )
+    return {**current, **rainfall}
+
+
+async def fetch_weather_many(
+    points: list[tuple[float, float]], concurrency: int = 8
+) -> dict[tuple[float, float], dict[str, Any] | Exception]:
+    """
+    Weather for many locations, fetched once per grid cell. Returns
+    {grid cell: weather summary or the exception that fetch raised}.
+    """
+    cells = list(dict.fromkeys(grid_cell(lat, lon) for lat, lon in points))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(cell: tuple[float, float]) -> dict[str, Any] | Exception:
+        async with semaphore:
+            try:
+                return await fetch_weather_and_rainfall(*cell)
+            except Exception as e:
+                return e
+
+    results = await asyncio.gather(*(one(cell) for cell in cells))
+    return dict(zip(cells, results))
+
+
+def cache_stats() -> dict[str, Any]:
+    return {
+        "grid_deg": settings.WEATHER_GRID_DEG,
+        "current": current_cache.stats(),
+        "rainfall": rainfall_cache.stats(),
+        "current_singleflight": current_flight.stats(),
+        "rainfall_singleflight": rainfall_flight.stats(),
+    }
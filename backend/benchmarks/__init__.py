@@ -0,0 +1 @@
+"""Standalone latency / throughput benchmarks for the backend."""
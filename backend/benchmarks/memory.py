@@ -0,0 +1,122 @@
+"""
+Per-worker memory benchmark for multi-worker deployments.
+
+    python -m backend.benchmarks.memory [--workers 4] [--modes copy,mmap,preload]
+
+Modes:
+
+    copy     uvicorn --workers N, MODEL_MMAP=0 (every worker unpickles its own models)
+    mmap     uvicorn --workers N, memory-mapped forest arrays and soil weights
+    preload  python -m backend.app.serve --workers N (models loaded once, then fork)
+
+Once every worker reports ready, each worker's RSS, PSS and USS (unique
+pages: what killing that one worker would free) are read from
+/proc/<pid>/smaps_rollup. Run it once beforehand so the forest artifacts
+next to the pickles exist.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from backend.app.memory import memory_stats
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except OSError:
+            continue
+        # Field 4 is the parent pid; the command name may contain spaces
+        ppid = int(stat.rpartition(")")[2].split()[1])
+        if ppid == pid and b"resource_tracker" not in cmdline:
+            children.append(int(entry))
+    return children
+
+
+def _command(mode: str, port: int, workers: int) -> tuple[list[str], dict[str, str]]:
+    env = dict(os.environ)
+    if mode == "preload":
+        cmd = ["-m", "backend.app.serve", "--log-level", "warning"]
+    else:
+        cmd = ["-m", "uvicorn", "backend.app.main:app", "--log-level", "warning"]
+        env["MODEL_MMAP"] = "0" if mode == "copy" else "1"
+    return [sys.executable, *cmd, "--port", str(port), "--workers", str(workers)], env
+
+
+def _measure(mode: str, workers: int, timeout: float) -> list[dict]:
+    port = _free_port()
+    cmd, env = _command(mode, port, workers)
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.perf_counter() + timeout
+        ready_pids: set[int] = set()
+        with httpx.Client(timeout=2.0) as client:
+            # New connection per request so the kernel spreads them over workers
+            while len(ready_pids) < workers and time.perf_counter() < deadline:
+                try:
+                    response = client.get(f"http://127.0.0.1:{port}/health", headers={"Connection": "close"})
+                    body = response.json()
+                    if body.get("ready"):
+                        ready_pids.add(body["memory"]["pid"])
+                except (httpx.TransportError, ValueError, KeyError):
+                    pass
+                time.sleep(0.05)
+        if len(ready_pids) < workers:
+            raise TimeoutError(f"{mode}: only {len(ready_pids)}/{workers} workers ready after {timeout:.0f}s")
+        time.sleep(1.0)
+        return [{"pid": pid, **(memory_stats(pid) or {})} for pid in sorted(_children(proc.pid))]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default="copy,mmap,preload")
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    baseline = None
+    for mode in args.modes.split(","):
+        stats = _measure(mode, args.workers, args.timeout)
+        uss = [s["uss_mb"] for s in stats]
+        mean_uss = sum(uss) / len(uss)
+        baseline = mean_uss if baseline is None else baseline
+        print(f"{mode}: {len(stats)} workers")
+        for s in stats:
+            print(f"  pid {s['pid']:>7}  rss {s['rss_mb']:7.1f} MB  pss {s['pss_mb']:7.1f} MB  uss {s['uss_mb']:7.1f} MB")
+        print(f"  mean USS {mean_uss:.1f} MB/worker  total USS {sum(uss):.1f} MB"
+              f"  saving vs first mode {baseline - mean_uss:+.1f} MB/worker")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Soil photo preprocessing benchmark: eager torchvision path vs draft-decode path.
+
+    python -m backend.benchmarks.preprocess [photo.jpg ...] [--model soil_classifier_model.pt]
+
+Without photos a synthetic 12 MP JPEG is generated. With --model the soil
+classifier is run on both tensors to confirm the predicted class is unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from backend.app.crop_soil.model.config import Class_name
+from backend.app.crop_soil.model.preprocess import load_pixels, pixels_to_tensor
+
+
+def _baseline_tensor(data: bytes) -> torch.Tensor:
+    """The original per-request path: full decode + freshly built Compose."""
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+    ])
+    return transform(image)
+
+
+def _fast_tensor(data: bytes) -> torch.Tensor:
+    return pixels_to_tensor([load_pixels(data)])[0]
+
+
+def _synthetic_photo(width: int = 4000, height: int = 3000) -> bytes:
+    rng = np.random.default_rng(0)
+    # Smooth gradients + grain, closer to a soil photo than pure noise
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([
+        120 + 60 * np.sin(x / 350.0),
+        90 + 40 * np.cos(y / 270.0),
+        60 + 30 * np.sin((x + y) / 500.0),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _time(fn, data: bytes, repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("photos", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--model", type=Path, default=None)
+    args = parser.parse_args()
+
+    photos = [(p.name, p.read_bytes()) for p in args.photos] or [("synthetic-12mp.jpg", _synthetic_photo())]
+
+    model = device = None
+    if args.model is not None:
+        from backend.app.crop_soil.model.loader import load_model
+        model, device = load_model(str(args.model), num_classes=len(Class_name))
+
+    for name, data in photos:
+        baseline = _time(_baseline_tensor, data, args.repeat)
+        fast = _time(_fast_tensor, data, args.repeat)
+        a, b = _baseline_tensor(data), _fast_tensor(data)
+        print(f"{name}: {len(data) / 1e6:.1f} MB")
+        print(f"  baseline  median {statistics.median(baseline):8.2f} ms")
+        print(f"  draft     median {statistics.median(fast):8.2f} ms"
+              f"  ({statistics.median(baseline) / statistics.median(fast):.1f}x)")
+        print(f"  tensor max |diff| {float((a - b).abs().max()):.4f}")
+
+        if model is not None:
+            with torch.no_grad():
+                probs = torch.softmax(model(torch.stack([a, b]).to(device)), dim=1).cpu()
+            conf, idx = probs.max(dim=1)
+            print(f"  baseline  {Class_name[idx[0]]} {conf[0] * 100:.2f}%")
+            print(f"  draft     {Class_name[idx[1]]} {conf[1] * 100:.2f}%"
+                  f"  (max prob diff {float((probs[0] - probs[1]).abs().max()):.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Accuracy-parity and latency check for the soil classifier optimization modes.
+
+    python -m backend.benchmarks.soil_optimize --holdout path/to/holdout \
+        [--calibration path/to/calibration] [--modes jit,dynamic,static]
+
+The holdout folder has one sub-folder per class, named like the classes in
+crop_soil/model/config.py ("Black Soil/", "Red Soil/", ...). For each mode
+the optimized model is built (or read from its cached artifact next to the
+checkpoint, unless --rebuild) and compared with the eager float model:
+
+    accuracy   top-1 accuracy on the holdout labels
+    agree      share of photos where top-1 matches the float model
+    max |dp|   largest softmax probability difference from the float model
+    ms/batch   median forward-pass latency at each --batch-sizes
+
+Static quantization calibrates on --calibration (default: the holdout
+itself, which flatters its accuracy; use a separate folder when you can).
+Without --holdout, synthetic photos give parity numbers only, and static is
+skipped unless --calibration is given: its artifact is reused by the server,
+so it is never calibrated on noise.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backend.app.crop_soil.model.config import Class_name
+from backend.app.crop_soil.model.loader import load_model
+from backend.app.crop_soil.model.optimize import MODES, artifact_path, calibration_batches, load_optimized
+from backend.app.crop_soil.model.preprocess import load_pixels, pixels_to_tensor
+
+DEFAULT_MODEL = Path(__file__).resolve().parents[1] / "soil_classifier_model.pt"
+
+
+def _holdout(directory: Path) -> tuple[torch.Tensor, list[int]]:
+    pixels, labels = [], []
+    for label, name in enumerate(Class_name):
+        folder = directory / name
+        if not folder.is_dir():
+            continue
+        for path in sorted(folder.rglob("*")):
+            if not path.is_file():
+                continue
+            try:
+                pixels.append(load_pixels(path.read_bytes()))
+            except Exception:
+                continue
+            labels.append(label)
+    if not pixels:
+        raise SystemExit(f"No photos found under {directory}/<class name>/")
+    return pixels_to_tensor(pixels), labels
+
+
+def _synthetic(count: int = 32) -> tuple[torch.Tensor, list[int] | None]:
+    rng = np.random.default_rng(0)
+    pixels = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, format="JPEG")
+        pixels.append(load_pixels(buf.getvalue()))
+    return pixels_to_tensor(pixels), None
+
+
+def _probabilities(model, images: torch.Tensor, batch: int = 16) -> torch.Tensor:
+    with torch.inference_mode():
+        return torch.cat([torch.softmax(model(images[i:i + batch]), dim=1) for i in range(0, len(images), batch)])
+
+
+def _latency_ms(model, images: torch.Tensor, batch: int, repeat: int) -> float:
+    x = images[:batch]
+    if len(x) < batch:
+        x = x.repeat((batch + len(x) - 1) // len(x), 1, 1, 1)[:batch]
+    samples = []
+    with torch.inference_mode():
+        for _ in range(3):
+            model(x)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            model(x)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, default=DEFAULT_MODEL)
+    parser.add_argument("--holdout", type=Path, default=None)
+    parser.add_argument("--calibration", type=Path, default=None)
+    parser.add_argument("--modes", default="jit,dynamic,static")
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rebuild", action="store_true", help="ignore cached artifacts")
+    args = parser.parse_args()
+
+    images, labels = _holdout(args.holdout) if args.holdout else _synthetic()
+    calibration_dir = args.calibration or args.holdout
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    float_model, _ = load_model(str(args.model), num_classes=len(Class_name), mmap=False)
+    reference = _probabilities(float_model, images)
+    reference_top1 = reference.argmax(dim=1)
+
+    def calibration():
+        return calibration_batches(calibration_dir)
+
+    print(f"{len(images)} photos, {'labelled' if labels else 'synthetic, parity only'}")
+    header = f"{'mode':<8} {'accuracy':>8} {'agree':>7} {'max |dp|':>9}  " + "  ".join(
+        f"{f'b={b} ms':>9}" for b in batch_sizes
+    )
+    print(header)
+
+    float_latency = {}
+    for mode in ["none", *[m for m in args.modes.split(",") if m and m != "none"]]:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode '{mode}', expected one of {MODES}")
+        if mode == "static" and calibration_dir is None:
+            print(f"{mode:<8} skipped: needs --calibration or --holdout photos")
+            continue
+        model = load_optimized(float_model, args.model, mode, calibration, rebuild=args.rebuild)
+        probs = _probabilities(model, images)
+        top1 = probs.argmax(dim=1)
+        accuracy = (
+            f"{float((top1 == torch.tensor(labels)).float().mean()) * 100:7.1f}%" if labels else f"{'-':>8}"
+        )
+        agree = float((top1 == reference_top1).float().mean()) * 100
+        max_diff = float((probs - reference).abs().max())
+
+        cells = []
+        for b in batch_sizes:
+            ms = _latency_ms(model, images, b, args.repeat)
+            float_latency.setdefault(b, ms)
+            cells.append(f"{ms:6.1f} ({float_latency[b] / ms:.1f}x)")
+        print(f"{mode:<8} {accuracy} {agree:6.1f}% {max_diff:9.4f}  " + "  ".join(f"{c:>9}" for c in cells))
+        if mode != "none":
+            path = artifact_path(args.model, mode)
+            if path.exists():
+                print(f"{'':<8} artifact {path.name} {path.stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark: how long a fresh worker takes to import, accept
+traffic and become ready.
+
+    python -m backend.benchmarks.startup [--runs 3] [--record startup_history.jsonl]
+
+Each run starts a new `uvicorn backend.app.main:app` process and polls
+/health/live and /health/ready. Reported per run:
+
+    import   seconds to `import backend.app.main` in a fresh interpreter
+    live     seconds from process start until /health/live answers
+    ready    seconds from process start until /health/ready returns 200
+
+plus per-model load/warm-up seconds from the ready payload. With --record
+the medians are appended as one JSON line tagged with the current git
+revision, so cold start can be tracked release over release.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import backend.app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _poll(client: httpx.Client, url: str, started: float, timeout: float, want_ok: bool) -> tuple[float, Any]:
+    while time.perf_counter() - started < timeout:
+        try:
+            response = client.get(url)
+            if not want_ok or response.status_code == 200:
+                return time.perf_counter() - started, response.json()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} not available after {timeout:.0f}s")
+
+
+def _server_run(timeout: float) -> dict[str, Any]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            live, _ = _poll(client, f"{base}/health/live", started, timeout, want_ok=False)
+            ready, payload = _poll(client, f"{base}/health/ready", started, timeout, want_ok=True)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    return {
+        "live": live,
+        "ready": ready,
+        "models": {
+            name: {"load": m["load_seconds"], "warmup": m["warmup_seconds"], "state": m["state"]}
+            for name, m in payload.get("models", {}).items()
+        },
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def _median_models(runs: list[dict[str, Any]]) -> dict[str, dict[str, float | None]]:
+    names = runs[0]["models"].keys()
+    summary = {}
+    for name in names:
+        summary[name] = {}
+        for key in ("load", "warmup"):
+            values = [r["models"][name][key] for r in runs if r["models"][name][key] is not None]
+            summary[name][key] = round(statistics.median(values), 3) if values else None
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for readiness")
+    parser.add_argument("--record", type=Path, default=None, help="append the result as a JSON line")
+    args = parser.parse_args()
+
+    imports, runs = [], []
+    for n in range(args.runs):
+        imports.append(_import_seconds())
+        runs.append(_server_run(args.timeout))
+        print(f"run {n + 1}: import {imports[-1]:.2f}s  live {runs[-1]['live']:.2f}s  ready {runs[-1]['ready']:.2f}s")
+
+    result = {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "cpus": os.cpu_count(),
+        "runs": args.runs,
+        "import_s": round(statistics.median(imports), 3),
+        "live_s": round(statistics.median(r["live"] for r in runs), 3),
+        "ready_s": round(statistics.median(r["ready"] for r in runs), 3),
+        "models": _median_models(runs),
+    }
+
+    print(f"median: import {result['import_s']:.2f}s  live {result['live_s']:.2f}s  ready {result['ready_s']:.2f}s")
+    for name, times in result["models"].items():
+        warmup = f"{times['warmup']:.3f}s" if times["warmup"] is not None else "-"
+        load = f"{times['load']:.3f}s" if times["load"] is not None else "-"
+        print(f"  {name:<12} load {load:>8}  warm-up {warmup:>8}")
+
+    if args.record is not None:
+        with open(args.record, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"recorded to {args.record}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Worker/thread topology sweep: finds the serve worker count, torch
+intra-op threads and sklearn forest n_jobs that give the best throughput
+on this machine, and writes them to the runtime config the app reads.
+
+    python -m backend.benchmarks.topology [--workers 1,2,4] [--torch-threads 1,2,4] \
+        [--forest-jobs 1,-1] [--concurrency 16] [--duration 15] [--output backend/runtime_config.json]
+
+Every combination starts `python -m backend.app.serve` with SERVE_WORKERS,
+TORCH_THREADS and FOREST_N_JOBS set, waits until it is ready and drives the
+real /predict pipeline (photo decode, soil batcher, crop/fertilizer/yield
+models) with `--concurrency` clients for `--duration` seconds. Every client
+posts the same photo, so the soil result cache is turned off
+(SOIL_CACHE_MAX_ENTRIES=0) to keep soil inference, and with it
+TORCH_THREADS, in every request. Open-Meteo is
+replaced by a local stub answering after `--weather-delay-ms`, spread over
+`--farms` locations so the weather cache sees a realistic mix of hits and
+misses. With `--batch-rows N` the clients post N-row /predict/batch
+requests instead; single /predict rows never reach sklearn (compiled
+forests handle them), so the forest jobs only matter for large batches.
+
+Reported per combination: throughput (requests/s), p50 and p99 latency and
+errors. The fastest error-free combination (within `--p99-budget-ms`, if
+given) is written under "settings" in `--output`, default
+backend/runtime_config.json, together with the measurements. Environment
+variables still override it. Combinations with more workers x threads than
+twice the CPU count are skipped unless listed explicitly with --all. The
+load generator runs on the same machine and takes some CPU of its own.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from backend.app import settings
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _powers_of_two(limit: int) -> list[int]:
+    values = {limit}
+    n = 1
+    while n < limit:
+        values.add(n)
+        n *= 2
+    return sorted(values)
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+class _WeatherStub(BaseHTTPRequestHandler):
+    """Open-Meteo forecast/archive look-alike with a fixed response delay."""
+
+    delay_s = 0.05
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        # Deterministic per location, so repeated cells agree
+        rng = random.Random(f"{query.get('latitude')}{query.get('longitude')}")
+        if url.path.endswith("/archive"):
+            body = {"daily": {"precipitation_sum": [round(rng.uniform(0, 12), 1) for _ in range(30)]}}
+        else:
+            body = {
+                "current": {
+                    "temperature_2m": round(rng.uniform(15, 35), 1),
+                    "relative_humidity_2m": round(rng.uniform(30, 90), 1),
+                    "cloud_cover": rng.randint(0, 100),
+                    "wind_speed_10m": round(rng.uniform(0, 8), 1),
+                    "weather_code": rng.choice([0, 1, 3, 61]),
+                }
+            }
+        time.sleep(self.delay_s)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def _start_weather_stub(delay_ms: float) -> tuple[ThreadingHTTPServer, str]:
+    handler = type("WeatherStub", (_WeatherStub,), {"delay_s": delay_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _photo() -> bytes:
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def _farms(count: int) -> list[tuple[float, float]]:
+    rng = random.Random(0)
+    return [(round(rng.uniform(8, 30), 4), round(rng.uniform(70, 88), 4)) for _ in range(count)]
+
+
+def _start_server(
+    port: int, workers: int, torch_threads: int, forest_jobs: int, weather_url: str
+) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        SERVE_WORKERS=str(workers),
+        TORCH_THREADS=str(torch_threads),
+        FOREST_N_JOBS=str(forest_jobs),
+        # Same photo every request: without this, soil inference runs once per worker
+        SOIL_CACHE_MAX_ENTRIES="0",
+        WEATHER_FORECAST_URL=f"{weather_url}/v1/forecast",
+        WEATHER_ARCHIVE_URL=f"{weather_url}/v1/archive",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "backend.app.serve", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(base: str, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    with httpx.Client(timeout=2.0) as client:
+        while time.perf_counter() < deadline:
+            try:
+                if client.get(f"{base}/health/ready").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+    raise TimeoutError(f"server not ready after {timeout:.0f}s")
+
+
+async def _drive(base: str, args: argparse.Namespace, photo: bytes, seconds: float) -> dict[str, Any]:
+    farms = _farms(args.farms)
+    rng = random.Random(1)
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    deadline = time.perf_counter() + seconds
+
+    def sample() -> dict[str, Any]:
+        lat, lon = rng.choice(farms)
+        return {"N": rng.randint(0, 140), "P": rng.randint(5, 145), "K": rng.randint(5, 205),
+                "ph": round(rng.uniform(4.5, 8.5), 2), "lat": lat, "lon": lon}
+
+    async def one(client: httpx.AsyncClient) -> None:
+        if args.batch_rows:
+            response = await client.post(
+                f"{base}/predict/batch", params={"days": args.days}, json=[sample() for _ in range(args.batch_rows)]
+            )
+        else:
+            data = {key: str(value) for key, value in sample().items()}
+            data["days"] = str(args.days)
+            response = await client.post(
+                f"{base}/predict", data=data, files={"file": ("soil.jpg", photo, "image/jpeg")}
+            )
+        if response.status_code != 200:
+            raise httpx.HTTPStatusError(str(response.status_code), request=response.request, response=response)
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await one(client)
+            except httpx.HTTPStatusError as e:
+                key = str(e.response.status_code)
+                errors[key] = errors.get(key, 0) + 1
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+            else:
+                latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1) if ordered else None,
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1) if ordered else None,
+    }
+
+
+def _run(
+    combo: tuple[int, int, int], args: argparse.Namespace, weather_url: str, photo: bytes
+) -> dict[str, Any]:
+    workers, torch_threads, forest_jobs = combo
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = _start_server(port, workers, torch_threads, forest_jobs, weather_url)
+    try:
+        _wait_ready(base, args.timeout)
+        asyncio.run(_drive(base, args, photo, args.warmup))
+        result = asyncio.run(_drive(base, args, photo, args.duration))
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"workers": workers, "torch_threads": torch_threads, "forest_n_jobs": forest_jobs, **result}
+
+
+def _recommend(results: list[dict[str, Any]], p99_budget_ms: float | None) -> dict[str, Any] | None:
+    candidates = [r for r in results if not r["errors"] and r["requests"]]
+    if p99_budget_ms is not None:
+        candidates = [r for r in candidates if r["p99_ms"] <= p99_budget_ms]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda r: (r["throughput_rps"], -r["p99_ms"]))
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> None:
+    cpus = os.cpu_count() or 1
+    sweep = ",".join(str(n) for n in _powers_of_two(cpus))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=sweep, help=f"serve worker counts (default {sweep})")
+    parser.add_argument("--torch-threads", default=sweep, help=f"torch threads per worker (default {sweep})")
+    parser.add_argument("--forest-jobs", default="1,-1", help="sklearn forest n_jobs values (default 1,-1)")
+    parser.add_argument("--all", action="store_true", help="keep oversubscribed combinations")
+    parser.add_argument("--concurrency", type=int, default=max(4, 2 * cpus))
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per combination")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds per combination")
+    parser.add_argument("--batch-rows", type=int, default=0, help="post N-row /predict/batch requests instead")
+    parser.add_argument("--days", type=int, default=30, help="yield forecast horizon per request")
+    parser.add_argument("--farms", type=int, default=200, help="distinct farm locations")
+    parser.add_argument("--weather-delay-ms", type=float, default=50.0)
+    parser.add_argument("--p99-budget-ms", type=float, default=None)
+    parser.add_argument("--timeout", type=float, default=180.0, help="seconds to wait for readiness")
+    parser.add_argument("--output", type=Path, default=settings.RUNTIME_CONFIG_PATH)
+    args = parser.parse_args()
+
+    combos = [
+        c for c in product(_int_list(args.workers), _int_list(args.torch_threads), _int_list(args.forest_jobs))
+        if args.all or c[0] * c[1] <= 2 * cpus
+    ]
+    if not combos:
+        raise SystemExit("No combinations left to run; pass --all to keep oversubscribed ones")
+
+    stub, weather_url = _start_weather_stub(args.weather_delay_ms)
+    photo = _photo()
+    target = f"/predict/batch x{args.batch_rows}" if args.batch_rows else "/predict"
+    print(f"{cpus} CPUs, {len(combos)} combinations, {target}, concurrency {args.concurrency}, {args.duration:.0f}s each")
+    print(f"{'workers':>7} {'torch':>5} {'forest':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  errors")
+
+    results = []
+    try:
+        for combo in combos:
+            try:
+                result = _run(combo, args, weather_url, photo)
+            except TimeoutError as e:
+                result = {"workers": combo[0], "torch_threads": combo[1], "forest_n_jobs": combo[2],
+                          "requests": 0, "errors": {"startup": str(e)}, "throughput_rps": 0.0,
+                          "p50_ms": None, "p99_ms": None}
+            results.append(result)
+            p50 = f"{result['p50_ms']:8.1f}" if result["p50_ms"] is not None else f"{'-':>8}"
+            p99 = f"{result['p99_ms']:8.1f}" if result["p99_ms"] is not None else f"{'-':>8}"
+            print(
+                f"{result['workers']:>7} {result['torch_threads']:>5} {result['forest_n_jobs']:>6} "
+                f"{result['throughput_rps']:8.2f} {p50} {p99}  {result['errors'] or ''}"
+            )
+    finally:
+        stub.shutdown()
+
+    best = _recommend(results, args.p99_budget_ms)
+    if best is None:
+        raise SystemExit("No combination ran without errors (or within the p99 budget); config not written")
+
+    config = {
+        "settings": {
+            "SERVE_WORKERS": best["workers"],
+            "TORCH_THREADS": best["torch_threads"],
+            "FOREST_N_JOBS": best["forest_n_jobs"],
+        },
+        "benchmark": {
+            "revision": _git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "cpus": cpus,
+            "target": target,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "weather_delay_ms": args.weather_delay_ms,
+            "p99_budget_ms": args.p99_budget_ms,
+            "results": results,
+        },
+    }
+    with open(args.output, "w") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+    print(
+        f"recommended: {best['workers']} workers x {best['torch_threads']} torch threads, "
+        f"forest n_jobs {best['forest_n_jobs']} ({best['throughput_rps']:.2f} req/s, p99 {best['p99_ms']:.1f} ms)"
+    )
+    print(f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,15 @@ import numpy as np
 import pandas as pd
 import os
 
+try:
+    from ..app.fertilizer.dosage_index import DosageIndex
+except ImportError:
+    from app.fertilizer.dosage_index import DosageIndex
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 df = pd.read_csv(os.path.join(BASE_DIR, "csv datasets", "state_soil_summary.csv"))
-dr = pd.read_csv(os.path.join(BASE_DIR, "csv datasets", "dosage_recommendation.csv"))
+dosage_index = DosageIndex.from_csv(os.path.join(BASE_DIR, "csv datasets", "dosage_recommendation.csv"))
 
 try:
     with open("app/models/fertilizer_model.pkl", "rb") as f:
@@ -117,16 +122,4 @@ def generalized_micronutrients(deficiency):
 
 
 def result(fertilizer, micronutrients):
-    dosage = []
-
-    for fert in fertilizer:
-        if fert in dr["fertilizers"].values:
-            value = dr.loc[dr["fertilizers"] == fert, "Dosage"].iloc[0]
-            dosage.append({fert: value})
-
-    for micro in micronutrients:
-        if micro in dr["fertilizers"].values:
-            value = dr.loc[dr["fertilizers"] == micro, "Dosage"].iloc[0]
-            dosage.append({micro: value})
-
-    return dosage
\ No newline at end of file
+    return dosage_index.dosage_list(list(fertilizer) + list(micronutrients))
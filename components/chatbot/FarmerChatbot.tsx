@@ -36,6 +36,8 @@ const FarmerChatbot: React.FC = () => {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const finalizedTextRef = useRef<string>(""); // Track all finalized text
   const synthesisRef = useRef<SpeechSynthesis | null>(null);
+  const abortRef = useRef<AbortController | null>(null);
+  const sessionIdRef = useRef<string | null>(null);
 
   /* -------------------- Text-to-Speech -------------------- */
 
@@ -193,6 +195,9 @@ const FarmerChatbot: React.FC = () => {
     recognitionRef.current = recognition;
   }, []);
 
+  // Stop a streaming reply if the chat is closed mid-answer
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   /* -------------------- Auto Scroll -------------------- */
 
   useEffect(() => {
@@ -218,61 +223,114 @@ const FarmerChatbot: React.FC = () => {
       const FASTAPI_URL =
         process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000";
 
-      const history = [...messages, userMessage]
-        .filter((m) => m.role !== "assistant" || m !== messages[0])
-        .map((msg) => ({
-          role: msg.role === "assistant" ? "model" : "user",
-          parts: [{ text: msg.content }],
-        }));
-
-      // Add timeout to prevent hanging requests
+      // Abort on timeout or unmount; aborting also cancels the generation server-side.
+      // The timeout is an idle timeout: it restarts whenever bytes arrive, so a
+      // long reply that keeps streaming is never cut off mid-answer.
       const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), 60000); // 60 second timeout
-      
-      const response = await fetch(`${FASTAPI_URL}/chat`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({
-          message: text,
-          conversation_history: history,
-        }),
-        signal: controller.signal,
-      }).catch((fetchError) => {
+      abortRef.current = controller;
+      let timedOut = false;
+      let timeoutId: ReturnType<typeof setTimeout> | undefined;
+      const restartTimeout = () => {
         clearTimeout(timeoutId);
-        if (fetchError.name === "AbortError") {
-          throw new Error("Request timeout: The server took too long to respond. Please try again.");
+        timeoutId = setTimeout(() => {
+          timedOut = true;
+          controller.abort();
+        }, 60000); // 60 seconds without data
+      };
+      restartTimeout();
+
+      try {
+        const response = await fetch(`${FASTAPI_URL}/chat/stream`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Accept: "text/event-stream",
+          },
+          // The server keeps the conversation; only the session id travels
+          body: JSON.stringify({
+            message: text,
+            session_id: sessionIdRef.current,
+          }),
+          signal: controller.signal,
+        }).catch((fetchError) => {
+          if (fetchError.name === "AbortError") {
+            throw new Error("Request timeout: The server took too long to respond. Please try again.");
+          }
+          throw new Error(
+            `Cannot connect to backend at ${FASTAPI_URL}. ` +
+            `Make sure the backend server is running.`
+          );
+        });
+
+        if (!response.ok || !response.body) {
+          throw new Error(`Backend error: ${response.status}`);
         }
-        throw new Error(
-          `Cannot connect to backend at ${FASTAPI_URL}. ` +
-          `Make sure the backend server is running.`
-        );
-      });
-      
-      clearTimeout(timeoutId);
-
-      if (!response.ok) {
-        throw new Error(`Backend error: ${response.status}`);
-      }
 
-      const data = await response.json();
-
-      const assistantMessage: Message = {
-        role: "assistant",
-        content:
-          data.message ||
-          "I'm sorry, I couldn't generate a response. Please try again.",
-        timestamp: new Date(),
-      };
+        // Show the reply as it streams in (server-sent events)
+        setMessages((prev) => [
+          ...prev,
+          { role: "assistant", content: "", timestamp: new Date() },
+        ]);
+        const appendToReply = (chunk: string) =>
+          setMessages((prev) => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, content: last.content + chunk }];
+          });
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let received = false;
+
+        for (;;) {
+          const { done, value } = await reader.read().catch((readError) => {
+            if (timedOut) {
+              throw new Error("Request timeout: The server stopped responding. Please try again.");
+            }
+            throw readError;
+          });
+          if (done) break;
+          restartTimeout();
+          buffer += decoder.decode(value, { stream: true });
+
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = "message";
+            let data = "";
+            for (const line of block.split("\n")) {
+              if (line.startsWith("event:")) event = line.slice(6).trim();
+              else if (line.startsWith("data:")) data += line.slice(5).trim();
+            }
+            if (!data) continue;
+            const payload = JSON.parse(data);
+
+            if (event === "chunk") {
+              received = true;
+              appendToReply(payload.text);
+            } else if (event === "done") {
+              sessionIdRef.current = payload.session_id ?? sessionIdRef.current;
+            } else if (event === "error") {
+              throw new Error(payload.detail || "The response was interrupted.");
+            }
+          }
+        }
 
-      setMessages((prev) => [...prev, assistantMessage]);
+        if (!received) {
+          appendToReply("I'm sorry, I couldn't generate a response. Please try again.");
+        }
+      } finally {
+        clearTimeout(timeoutId);
+        if (abortRef.current === controller) abortRef.current = null;
+      }
     } catch (error: any) {
       setMessages((prev) => [
         ...prev,
         {
           role: "assistant",
-          content: `Error: ${error.message}`,
+          content: `Error: ${error.name === "AbortError" ? "The response was cancelled." : error.message}`,
           timestamp: new Date(),
         },
       ]);